@@ -0,0 +1,206 @@
+import heapq
+import os
+import weakref
+import numpy as np
+from compiled import compiled_graph, compile_graph, compiled_for
+from greedy import dijkstras_compiled
+
+# ALT = A*, Landmarks and the Triangle inequality.
+# For a landmark L, d(L,t) - d(L,v) <= d(v,t) and d(v,L) - d(t,L) <= d(v,t),
+# the max over all landmarks is an admissible (and consistent) heuristic for A*
+
+LANDMARK_PATH = "alt_landmarks.npz"
+#up to this many table entries the heuristic of every vertex is computed with
+#numpy when a query starts, bigger graphs evaluate it lazily per reached vertex
+VECTOR_HEURISTIC_LIMIT = 4_000_000
+
+class alt_index:
+    """
+    Landmark distance tables for one compiled graph.
+    forward[i][v] = d(landmarks[i], v), backward[i][v] = d(v, landmarks[i])
+    """
+    def __init__(self, landmarks, forward, backward, fingerprint):
+        self.landmarks = list(landmarks)
+        self.forward = forward
+        self.backward = backward
+        self.fingerprint = fingerprint
+        #per vertex rows as plain python floats, the heuristic is evaluated one vertex at a time
+        self.forward_rows = forward.T.tolist()
+        self.backward_rows = backward.T.tolist()
+
+    def heuristic(self, v: int, target: int):
+        """Lower bound on d(v, target), inf if target can't be reached from v"""
+        inf = float('inf')
+        best = 0
+        fv, bv = self.forward_rows[v], self.backward_rows[v]
+        ft, bt = self.forward_rows[target], self.backward_rows[target]
+        for i in range(len(self.landmarks)):
+            if fv[i] != inf:
+                if ft[i] == inf:
+                    return inf
+                if ft[i] - fv[i] > best:
+                    best = ft[i] - fv[i]
+            if bt[i] != inf:
+                if bv[i] == inf:
+                    return inf
+                if bv[i] - bt[i] > best:
+                    best = bv[i] - bt[i]
+        return best
+
+    def heuristics_to(self, target: int):
+        """heuristic(v, target) for every vertex at once, as a list indexed by id"""
+        ft = self.forward[:, target][:, None]
+        bt = self.backward[:, target][:, None]
+        with np.errstate(invalid="ignore"):
+            #a landmark that can't reach v (or that t can't reach) gives no bound
+            fwd = np.where(np.isfinite(self.forward), ft - self.forward, 0.0)
+            bwd = np.where(np.isfinite(bt), self.backward - bt, 0.0)
+        return np.maximum(np.maximum(fwd.max(axis=0), bwd.max(axis=0)), 0.0).tolist()
+
+    def save(self, path: str = LANDMARK_PATH):
+        np.savez(path, landmarks=np.array(self.landmarks, dtype=np.int32),
+                 forward=self.forward, backward=self.backward,
+                 fingerprint=np.array(self.fingerprint))
+
+
+def _distances_from(graph: compiled_graph, source: int):
+    distances, _ = dijkstras_compiled(graph.kanji[source], graph)
+    return np.array(distances, dtype=np.float64)
+
+def select_landmarks(graph: compiled_graph, num_landmarks: int, method: str = "farthest"):
+    """
+    "degree": the num_landmarks highest degree vertices
+    "farthest": start at the highest degree vertex, then repeatedly add the reached
+    vertex that is farthest from all landmarks picked so far
+    Returns the landmark ids and the forward tables computed along the way (or None)
+    """
+    degree = np.diff(graph.offsets)
+    num_landmarks = min(num_landmarks, graph.num_nodes)
+    if method == "degree":
+        return np.argsort(-degree, kind='stable')[:num_landmarks].tolist(), None
+    if method != "farthest":
+        raise ValueError(f"unknown landmark selection method: {method}")
+
+    landmarks = [int(np.argmax(degree))]
+    forward = [_distances_from(graph, landmarks[0])]
+    nearest = forward[0].copy()
+    while len(landmarks) < num_landmarks:
+        candidates = np.where(np.isfinite(nearest), nearest, -1.0)
+        candidates[landmarks] = -1.0
+        nxt = int(np.argmax(candidates))
+        if candidates[nxt] <= 0:
+            break
+        landmarks.append(nxt)
+        forward.append(_distances_from(graph, nxt))
+        nearest = np.minimum(nearest, forward[-1])
+    return landmarks, forward
+
+def build_alt_index(graph: compiled_graph, num_landmarks: int = 16, method: str = "farthest"):
+    landmarks, forward = select_landmarks(graph, num_landmarks, method)
+    if forward is None:
+        forward = [_distances_from(graph, l) for l in landmarks]
+    reverse = graph.reverse()
+    backward = [_distances_from(reverse, l) for l in landmarks]
+    return alt_index(landmarks, np.vstack(forward), np.vstack(backward), graph.fingerprint())
+
+def load_alt_index(graph: compiled_graph, path: str = LANDMARK_PATH, num_landmarks: int = 16,
+                   method: str = "farthest"):
+    """
+    Load the landmark tables from path, rebuilding (and saving) them when the
+    file is missing or was built for a different graph
+    """
+    fingerprint = graph.fingerprint()
+    if os.path.exists(path):
+        with np.load(path) as data:
+            if str(data["fingerprint"]) == fingerprint and len(data["landmarks"]) == num_landmarks:
+                return alt_index(data["landmarks"].tolist(), data["forward"], data["backward"], fingerprint)
+    index = build_alt_index(graph, num_landmarks, method)
+    index.save(path)
+    return index
+
+#one index per live graph, dropped together with the graph
+_indexes = weakref.WeakKeyDictionary()
+
+def get_alt_index(graph: compiled_graph, path: str = LANDMARK_PATH):
+    if graph not in _indexes:
+        _indexes[graph] = load_alt_index(graph, path)
+    return _indexes[graph]
+
+def alt_search(source: int, target: int, graph: compiled_graph, index: alt_index):
+    """
+    A* from source to target guided by the landmark heuristic.
+    Returns (distance, predecessors dict, number of settled vertices)
+    """
+    inf = float('inf')
+    offsets = memoryview(graph.offsets)
+    neighbors = memoryview(graph.neighbors)
+    weights = memoryview(graph.weights)
+
+    distances = {source: 0}
+    predecessors = {source: -1}
+    settled = set()
+    if graph.num_nodes * len(index.landmarks) <= VECTOR_HEURISTIC_LIMIT:
+        h = index.heuristics_to(target)
+    else:
+        h = {source: index.heuristic(source, target)}
+    if h[source] == inf:
+        return inf, predecessors, 0
+
+    pq = [(h[source], source)]
+    while pq:
+        _, u = heapq.heappop(pq)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target:
+            return distances[u], predecessors, len(settled)
+        du = distances[u]
+        for i in range(offsets[u], offsets[u + 1]):
+            v = neighbors[i]
+            new_dist = du + weights[i]
+            if new_dist < distances.get(v, inf):
+                if type(h) is dict and v not in h:
+                    h[v] = index.heuristic(v, target)
+                if h[v] == inf:
+                    continue
+                distances[v] = new_dist
+                predecessors[v] = u
+                heapq.heappush(pq, (new_dist + h[v], v))
+
+    return inf, predecessors, len(settled)
+
+def find_learning_path_alt(source_kanji: str, target_kanji: str, kanji_dict, index: alt_index = None):
+    """Same result as greedy.find_learning_path, searched with ALT"""
+    graph = compiled_for(kanji_dict)
+    if source_kanji not in graph.index:
+        print(f"Error : {source_kanji} not found in kanji dictionary")
+        return None, None
+    if target_kanji not in graph.index:
+        print(f"Error: {target_kanji} not found in dictionary")
+        return None, None
+    if index is None:
+        index = get_alt_index(graph)
+
+    target = graph.index[target_kanji]
+    distance, predecessors, _ = alt_search(graph.index[source_kanji], target, graph, index)
+    if distance == float('inf'):
+        print(f"No path exists from {source_kanji} to {target_kanji}")
+        return None, None
+
+    path = []
+    current = target
+    while current != -1:
+        path.append(graph.kanji[current])
+        current = predecessors[current]
+    path.reverse()
+    return path, distance
+
+
+if __name__ == '__main__':
+    from parsing import parse_raw_data
+    graph = compile_graph(parse_raw_data())
+    index = get_alt_index(graph)
+    print(f"{len(index.landmarks)} landmarks: {' '.join(graph.kanji[l] for l in index.landmarks)}")
+    for source, target in [("一", "謝"), ("人", "働"), ("口", "話"), ("森", "鑑"), ("醸", "森")]:
+        distance, _, settled = alt_search(graph.index[source], graph.index[target], graph, index)
+        print(f"{source} → {target}: weight {distance:.2f}, settled {settled}/{graph.num_nodes} vertices")
@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+# Headless benchmark suite. Every case is timed with warmup runs followed by
+# repeated trials on seeded workloads, and the results are written as JSON
+# so a later run can be compared against a stored baseline.
+#
+#   python benchmark.py --out bench.json
+#   python benchmark.py --out new.json --compare bench.json --threshold 0.15
+
+def time_case(fn, warmup: int, repeat: int):
+    """Run fn warmup times untimed, then repeat timed trials. fn gets the trial number"""
+    for i in range(warmup):
+        fn(i)
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        "trials": repeat,
+        "mean_ms": float(times.mean()),
+        "min_ms": float(times.min()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "max_ms": float(times.max()),
+    }
+
+def _sources(graph, count, rng):
+    return [graph.kanji[i] for i in rng.sample(range(graph.num_nodes), min(count, graph.num_nodes))]
+
+def bench_parsing(results, warmup, repeat, seed, quick):
+    from parsing import parse_raw_data
+    from snapshot import load_graph
+    results["parsing/parse_raw_data"] = time_case(lambda i: parse_raw_data(), warmup, repeat)
+    load_graph()
+    results["parsing/snapshot_load"] = time_case(lambda i: load_graph(), warmup, repeat)
+
+def bench_sssp(results, warmup, repeat, seed, quick):
+    from greedy import dijkstras
+    from parsing import parse_raw_data
+    from snapshot import load_graph
+    graph = load_graph()
+    kanji_dict = parse_raw_data()
+    rng = random.Random(seed)
+
+    sizes = [300, 1000, graph.num_nodes] if quick else [100, 300, 600, 1000, 1500, graph.num_nodes]
+    for n in sizes:
+        keep = set(rng.sample(graph.kanji, n))
+        sub = graph.subgraph(keep)
+        sub_dict = {k: v for k, v in kanji_dict.items() if k in keep}
+        sources = _sources(sub, 16, rng)
+        results[f"sssp/heapdict/n={n}"] = time_case(lambda i: dijkstras(sources[i % len(sources)], sub_dict),
+                                                   warmup, repeat)
+        for backend in ("heap", "radix"):
+            results[f"sssp/compiled-{backend}/n={n}"] = time_case(
+                lambda i: dijkstras(sources[i % len(sources)], sub, backend=backend), warmup, repeat)
+
+    from synthetic import fit_model, generate_graph
+    model = fit_model(graph)
+    for n in ([10_000] if quick else [10_000, 100_000]):
+        big = generate_graph(n, model, seed)
+        sources = _sources(big, 16, rng)
+        for backend in ("heap", "radix"):
+            results[f"sssp/compiled-{backend}/synthetic-n={big.num_nodes}"] = time_case(
+                lambda i: dijkstras(sources[i % len(sources)], big, backend=backend), warmup, repeat)
+
+def bench_paths(results, warmup, repeat, seed, quick):
+    from greedy import find_learning_path
+    from alt import get_alt_index
+    from ch import get_ch_index
+    from snapshot import load_graph
+    from tree_cache import path_tree_cache
+    graph = load_graph()
+    rng = random.Random(seed)
+    pairs = [(rng.choice(graph.kanji), rng.choice(graph.kanji)) for _ in range(64)]
+    get_alt_index(graph)
+    get_ch_index(graph)
+    cache = path_tree_cache()
+
+    def run(engine):
+        def fn(i):
+            #a whole batch of pairs per trial, queries without a path print a line each
+            with open(os.devnull, "w") as devnull:
+                stdout, sys.stdout = sys.stdout, devnull
+                try:
+                    for source, target in pairs:
+                        if engine == "cache":
+                            cache.find_learning_path(source, target, graph)
+                        else:
+                            find_learning_path(source, target, graph, engine=engine)
+                finally:
+                    sys.stdout = stdout
+        return fn
+
+    for engine in ("dijkstra", "alt", "ch", "cache"):
+        results[f"paths/{engine}/64-pairs"] = time_case(run(engine), warmup, repeat)
+
+def bench_inversions(results, warmup, repeat, seed, quick):
+    from count import count_inversions, prefix_inversions, batch_inversions
+    rng = np.random.default_rng(seed)
+    for n in ([1000, 10000] if quick else [1000, 10000, 100000]):
+        arr = rng.permutation(n).tolist()
+        results[f"inversions/merge/n={n}"] = time_case(lambda i: count_inversions(arr), warmup, repeat)
+        results[f"inversions/fenwick-prefix/n={n}"] = time_case(lambda i: prefix_inversions(arr), warmup, repeat)
+    matrix = np.argsort(rng.random((200, 2136)), axis=1)
+    results["inversions/batch/200x2136"] = time_case(lambda i: batch_inversions(matrix), warmup, repeat)
+
+def bench_layout(results, warmup, repeat, seed, quick):
+    import networkx as nx
+    from snapshot import load_graph
+    from greedy import find_example_paths
+    from visualization import create_kanji_graph
+    graph = load_graph()
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            _, _, nodes = find_example_paths(graph)
+        finally:
+            sys.stdout = stdout
+    G = create_kanji_graph(graph, nodes)
+    results[f"layout/spring/n={G.number_of_nodes()}"] = time_case(
+        lambda i: nx.spring_layout(G, k=2, iterations=50, seed=seed), warmup, repeat)
+
+GROUPS = {
+    "parsing": bench_parsing,
+    "sssp": bench_sssp,
+    "paths": bench_paths,
+    "inversions": bench_inversions,
+    "layout": bench_layout,
+}
+
+def run_benchmarks(groups=None, warmup: int = 2, repeat: int = 10, seed: int = 0, quick: bool = False):
+    results = {}
+    skipped = {}
+    for name in (groups or list(GROUPS)):
+        start = time.perf_counter()
+        try:
+            GROUPS[name](results, warmup, repeat, seed, quick)
+        except ImportError as e:
+            #optional plotting dependencies may be missing on a headless box
+            skipped[name] = str(e)
+            continue
+        print(f"{name}: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "warmup": warmup,
+            "repeat": repeat,
+            "quick": quick,
+            "skipped": skipped,
+        },
+        "results": results,
+    }
+
+def compare_results(current: dict, baseline: dict, threshold: float = 0.1, stat: str = "p50_ms"):
+    """
+    Cases whose `stat` got slower than baseline * (1 + threshold).
+    Returns a list of (case, baseline, current, ratio) for every shared case
+    and the list of regressed case names
+    """
+    rows = []
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name][stat]
+        after = result[stat]
+        ratio = after / before if before > 0 else float("inf")
+        rows.append((name, before, after, ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kanji graph benchmark suite")
+    parser.add_argument("--groups", nargs="*", choices=list(GROUPS), help="groups to run (default: all)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="smaller sweeps")
+    parser.add_argument("--out", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.groups, args.warmup, args.repeat, args.seed, args.quick)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        rows, regressions = compare_results(report, baseline, args.threshold)
+        print(f"\n=== Compared to {args.compare} (p50) ===", file=sys.stderr)
+        for name, before, after, ratio in rows:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:45s} {before:10.3f} ms → {after:10.3f} ms  x{ratio:.2f}{flag}", file=sys.stderr)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from parsing import kanji_class, IMPUTED_FIELDS
+
+class compiled_graph:
+    """
+    Array backed (CSR) version of the kanji graph returned by parse_raw_data.
+    Every kanji is interned to an integer id (its position in `kanji`), the
+    out edges of node u are neighbors[offsets[u]:offsets[u+1]] with the
+    matching weights, still presorted by weight like the composed lists.
+    Supports the read only parts of the dict interface (in, [], len, keys,
+    items) so code written against the kanji dict keeps working.
+    imputed holds one bit per IMPUTED_FIELDS entry (bit i set: that metric
+    was imputed), all zero when not given.
+    """
+    def __init__(self, kanji, ids, strokes, grade, jlpt, rfreq, kfreq, difficulty,
+                 offsets, neighbors, weights, imputed=None):
+        self.kanji = list(kanji)
+        self.index = {k: i for i, k in enumerate(self.kanji)}
+        self.ids = ids
+        self.strokes = strokes
+        self.grade = grade
+        self.jlpt = jlpt
+        self.rfreq = rfreq
+        self.kfreq = kfreq
+        self.difficulty = difficulty
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+        self.imputed = np.zeros(len(self.kanji), dtype=np.uint8) if imputed is None else imputed
+
+    @property
+    def num_nodes(self):
+        return len(self.kanji)
+
+    @property
+    def num_edges(self):
+        return len(self.neighbors)
+
+    def out_edges(self, u: int):
+        """(neighbor ids, weights) of node id u"""
+        lo, hi = self.offsets[u], self.offsets[u + 1]
+        return self.neighbors[lo:hi], self.weights[lo:hi]
+
+    def node(self, u: int) -> kanji_class:
+        """Materialize node id u as a kanji_class (composed rebuilt from the arrays)"""
+        nbrs, wts = self.out_edges(u)
+        return kanji_class(
+            id=str(int(self.ids[u])),
+            kanji=self.kanji[u],
+            strokes=int(self.strokes[u]),
+            grade=int(self.grade[u]),
+            jlpt=int(self.jlpt[u]),
+            rfreq=int(self.rfreq[u]),
+            kfreq=int(self.kfreq[u]),
+            difficulty=float(self.difficulty[u]),
+            composed=[(self.kanji[v], float(w)) for v, w in zip(nbrs.tolist(), wts.tolist())],
+            imputed=_imputed_names(int(self.imputed[u]))
+        )
+
+    def subgraph(self, keep):
+        """Induced subgraph on the kanji in `keep`, ids are renumbered"""
+        mask = np.zeros(self.num_nodes, dtype=bool)
+        for k in keep:
+            u = self.index.get(k)
+            if u is not None:
+                mask[u] = True
+        new_id = np.full(self.num_nodes, -1, dtype=np.int64)
+        new_id[mask] = np.arange(int(mask.sum()))
+
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.offsets))
+        edge_mask = mask[src] & mask[self.neighbors]
+        sub_src = new_id[src[edge_mask]]
+        counts = np.bincount(sub_src, minlength=int(mask.sum()))
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return compiled_graph(
+            [k for k, m in zip(self.kanji, mask.tolist()) if m],
+            self.ids[mask], self.strokes[mask], self.grade[mask], self.jlpt[mask],
+            self.rfreq[mask], self.kfreq[mask], self.difficulty[mask],
+            offsets, new_id[self.neighbors[edge_mask]].astype(np.int32), self.weights[edge_mask],
+            self.imputed[mask]
+        )
+
+    def reverse(self):
+        """Graph with every edge flipped (same ids), used for backward searches"""
+        src = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.offsets))
+        order = np.argsort(self.neighbors, kind='stable')
+        counts = np.bincount(self.neighbors, minlength=self.num_nodes)
+        offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return compiled_graph(
+            self.kanji, self.ids, self.strokes, self.grade, self.jlpt, self.rfreq,
+            self.kfreq, self.difficulty, offsets, src[order], self.weights[order], self.imputed
+        )
+
+    def fingerprint(self):
+        """Hash of the node set and edges, used to tell if a saved index still matches"""
+        h = hashlib.sha1()
+        h.update("".join(self.kanji).encode("utf-8"))
+        for a in (self.offsets, self.neighbors, self.weights):
+            h.update(np.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+
+    # dict style access, so the graph can stand in for the kanji dict.
+    # values are kanji_view records reading the columns, node(u) copies one out
+    def __contains__(self, kanji):
+        return kanji in self.index
+
+    def __getitem__(self, kanji):
+        return kanji_view(self, self.index[kanji])
+
+    def get(self, kanji, default=None):
+        u = self.index.get(kanji)
+        return default if u is None else kanji_view(self, u)
+
+    def __len__(self):
+        return len(self.kanji)
+
+    def __iter__(self):
+        return iter(self.kanji)
+
+    def keys(self):
+        return list(self.kanji)
+
+    def items(self):
+        return [(k, kanji_view(self, u)) for u, k in enumerate(self.kanji)]
+
+    def values(self):
+        return [kanji_view(self, u) for u in range(len(self.kanji))]
+
+    def nbytes(self):
+        """Memory held by the arrays (not counting the interning dict)"""
+        return sum(a.nbytes for a in (self.ids, self.strokes, self.grade, self.jlpt, self.rfreq,
+                                      self.kfreq, self.difficulty, self.offsets, self.neighbors,
+                                      self.weights, self.imputed))
+
+
+class kanji_view:
+    """
+    Read only stand in for the kanji_class of node u: the same attributes, read
+    from the typed columns of the graph when accessed (composed is rebuilt on
+    each access). Two slots per record instead of a copy of every field.
+    """
+    __slots__ = ("graph", "u")
+
+    def __init__(self, graph: compiled_graph, u: int):
+        self.graph = graph
+        self.u = u
+
+    @property
+    def id(self):
+        return str(int(self.graph.ids[self.u]))
+
+    @property
+    def kanji(self):
+        return self.graph.kanji[self.u]
+
+    @property
+    def strokes(self):
+        return int(self.graph.strokes[self.u])
+
+    @property
+    def grade(self):
+        return int(self.graph.grade[self.u])
+
+    @property
+    def jlpt(self):
+        return int(self.graph.jlpt[self.u])
+
+    @property
+    def rfreq(self):
+        return int(self.graph.rfreq[self.u])
+
+    @property
+    def kfreq(self):
+        return int(self.graph.kfreq[self.u])
+
+    @property
+    def difficulty(self):
+        return float(self.graph.difficulty[self.u])
+
+    @property
+    def composed(self):
+        nbrs, wts = self.graph.out_edges(self.u)
+        return [(self.graph.kanji[v], float(w)) for v, w in zip(nbrs.tolist(), wts.tolist())]
+
+    @property
+    def imputed(self):
+        return _imputed_names(int(self.graph.imputed[self.u]))
+
+    def materialize(self) -> kanji_class:
+        return self.graph.node(self.u)
+
+    def __eq__(self, other):
+        if isinstance(other, kanji_view):
+            return self.graph is other.graph and self.u == other.u
+        if isinstance(other, kanji_class):
+            return self.materialize() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.materialize()).replace("kanji_class(", "kanji_view(", 1)
+
+def _imputed_bits(names) -> int:
+    return sum(1 << i for i, name in enumerate(IMPUTED_FIELDS) if name in names)
+
+def _imputed_names(bits: int) -> tuple:
+    return tuple(name for i, name in enumerate(IMPUTED_FIELDS) if bits >> i & 1)
+
+def compile_graph(kanji_dict: dict) -> compiled_graph:
+    """Compile the kanji dict from parse_raw_data into a compiled_graph"""
+    kanji = list(kanji_dict.keys())
+    index = {k: i for i, k in enumerate(kanji)}
+    objs = list(kanji_dict.values())
+
+    offsets = np.zeros(len(kanji) + 1, dtype=np.int64)
+    neighbors = []
+    weights = []
+    for u, obj in enumerate(objs):
+        for v, w in obj.composed:
+            if v in index:
+                neighbors.append(index[v])
+                weights.append(w)
+        offsets[u + 1] = len(neighbors)
+
+    return compiled_graph(
+        kanji,
+        np.array([int(o.id) for o in objs], dtype=np.int64),
+        np.array([o.strokes for o in objs], dtype=np.int32),
+        np.array([o.grade for o in objs], dtype=np.int32),
+        np.array([o.jlpt for o in objs], dtype=np.int32),
+        np.array([o.rfreq for o in objs], dtype=np.int64),
+        np.array([o.kfreq for o in objs], dtype=np.int64),
+        np.array([o.difficulty for o in objs], dtype=np.float64),
+        offsets,
+        np.array(neighbors, dtype=np.int32),
+        np.array(weights, dtype=np.float64),
+        np.array([_imputed_bits(o.imputed) for o in objs], dtype=np.uint8)
+    )
+
+#compiled forms of plain kanji dicts by id, see compiled_for. The dict is kept
+#alongside its graph, so an id can't be reused while the entry exists
+MAX_COMPILED = 4
+_compiled = OrderedDict()
+
+def compiled_for(kanji_dict) -> compiled_graph:
+    """
+    kanji_dict itself if it is a compiled_graph, otherwise its compiled form,
+    built once per dict object together with its reachability index (dicts
+    can't be weak keys, so the last MAX_COMPILED dicts are held). Call forget_compiled after editing a dict in
+    place; graph_updater events do this
+    """
+    if isinstance(kanji_dict, compiled_graph):
+        return kanji_dict
+    key = id(kanji_dict)
+    entry = _compiled.get(key)
+    if entry is None or len(entry[1]) != len(kanji_dict):
+        from reachability import get_reachability_index
+        entry = _compiled[key] = (kanji_dict, compile_graph(kanji_dict))
+        #built with the graph, so the first query doesn't pay for it
+        get_reachability_index(entry[1])
+        while len(_compiled) > MAX_COMPILED:
+            _compiled.popitem(last=False)
+    _compiled.move_to_end(key)
+    return entry[1]
+
+def forget_compiled(kanji_dict, keep: compiled_graph = None):
+    """
+    Drop the compiled form of kanji_dict, the next compiled_for rebuilds it.
+    keep: a graph that was patched along with the dict, kept if it is the one held
+    """
+    entry = _compiled.get(id(kanji_dict))
+    if entry is not None and entry[0] is kanji_dict and entry[1] is not keep:
+        del _compiled[id(kanji_dict)]
+
+
+if __name__ == '__main__':
+    from parsing import parse_raw_data
+    graph = compile_graph(parse_raw_data())
+    print(f"compiled graph: {graph.num_nodes} nodes, {graph.num_edges} edges, {graph.nbytes()} bytes of arrays")
@@ -0,0 +1,135 @@
+import numpy as np
+from parsing import iter_json_array
+
+# Bitset index over the krad.json components. Every component symbol gets a
+# bit and every kanji the bitmask of its components, stored as rows of
+# uint64 words, so "which kanji can be built from what the learner knows" is
+# a bitwise and-not plus a popcount over all kanji at once:
+#   missing[k] = popcount(masks[k] & ~known)
+
+class component_index:
+    """
+    kanji[i] has the components whose bits are set in masks[i]
+    (components[b] is the symbol of bit b)
+    """
+    def __init__(self, kanji, components, masks):
+        self.kanji = list(kanji)
+        self.components = list(components)
+        self.bit = {c: b for b, c in enumerate(self.components)}
+        self.index = {k: i for i, k in enumerate(self.kanji)}
+        self.masks = masks
+        self.word_columns = np.ascontiguousarray(masks.T)
+
+    @property
+    def words(self):
+        return self.masks.shape[1]
+
+    def mask_of(self, known) -> np.ndarray:
+        """Bitmask of the known symbols, symbols that are not components are ignored"""
+        mask = np.zeros(self.words, dtype=np.uint64)
+        for symbol in known:
+            b = self.bit.get(symbol)
+            if b is not None:
+                mask[b >> 6] |= np.uint64(1 << (b & 63))
+        return mask
+
+    def masks_of(self, learners) -> np.ndarray:
+        """(learners, words) bitmasks, one row per known set"""
+        return np.vstack([self.mask_of(known) for known in learners]) if learners else \
+            np.zeros((0, self.words), dtype=np.uint64)
+
+    def missing_counts(self, known) -> np.ndarray:
+        """
+        Number of components of every kanji that are not known. known is a
+        set of symbols or a mask, or a (learners, words) mask matrix which
+        gives a (learners, kanji) result
+        """
+        if not isinstance(known, np.ndarray):
+            known = self.mask_of(known)
+        single = known.ndim == 1
+        known = np.atleast_2d(~known)
+        #word by word over the word-major copy, each step is one contiguous
+        #(learners, kanji) and + popcount
+        counts = np.zeros((len(known), len(self.kanji)), dtype=np.int16)
+        for w in range(self.words):
+            counts += np.bitwise_count(self.word_columns[w][None, :] & known[:, w][:, None])
+        return counts[0] if single else counts
+
+    def _select(self, selected: np.ndarray, known, exclude_known: bool):
+        kanji = [self.kanji[i] for i in np.flatnonzero(selected).tolist()]
+        if exclude_known and not isinstance(known, np.ndarray):
+            known = set(known)
+            kanji = [k for k in kanji if k not in known]
+        return kanji
+
+    def composable(self, known, exclude_known: bool = True):
+        """Kanji whose components are all known"""
+        return self._select(self.missing_counts(known) == 0, known, exclude_known)
+
+    def frontier(self, known, missing: int = 1, exclude_known: bool = True):
+        """Kanji missing exactly `missing` components"""
+        return self._select(self.missing_counts(known) == missing, known, exclude_known)
+
+    def next_components(self, known):
+        """{component: kanji it would complete} over the kanji missing exactly one component"""
+        mask = known if isinstance(known, np.ndarray) else self.mask_of(known)
+        rows = np.flatnonzero(self.missing_counts(mask) == 1)
+        lacking = self.masks[rows] & ~mask
+        #the one set bit of each row: its word, then its position in the word
+        word = np.argmax(lacking != 0, axis=1)
+        value = lacking[np.arange(len(rows)), word]
+        bit = word * 64 + np.log2(value.astype(np.float64)).astype(np.int64)
+        unlocks = {}
+        for i, b in zip(rows.tolist(), bit.tolist()):
+            unlocks.setdefault(self.components[b], []).append(self.kanji[i])
+        return unlocks
+
+    def batch_frontier(self, learners, missing: int = 1, chunk_size: int = 256):
+        """
+        frontier (known kanji included) for many known sets at once, chunked so
+        only chunk_size x kanji missing counts are held at a time
+        """
+        results = []
+        for lo in range(0, len(learners), chunk_size):
+            counts = self.missing_counts(self.masks_of(learners[lo:lo + chunk_size]))
+            for row in counts == missing:
+                results.append([self.kanji[i] for i in np.flatnonzero(row).tolist()])
+        return results
+
+
+def build_component_index(path: str = "krad.json", kanji=None) -> component_index:
+    """
+    Index of the krad literals (only those in `kanji` when given, e.g. a
+    kanji dict or compiled graph) and their component sets
+    """
+    literals = []
+    sets = []
+    bit = {}
+    for entry in iter_json_array(path):
+        if kanji is not None and entry["literal"] not in kanji:
+            continue
+        literals.append(entry["literal"])
+        sets.append([bit.setdefault(c, len(bit)) for c in entry["components"]])
+    masks = np.zeros((len(literals), max((len(bit) + 63) // 64, 1)), dtype=np.uint64)
+    rows = np.repeat(np.arange(len(literals)), [len(s) for s in sets])
+    bits = np.array([b for s in sets for b in s], dtype=np.int64)
+    np.bitwise_or.at(masks, (rows, bits >> 6), np.left_shift(np.uint64(1), (bits & 63).astype(np.uint64)))
+    return component_index(literals, list(bit), masks)
+
+
+if __name__ == '__main__':
+    import time
+    index = build_component_index()
+    print(f"{len(index.kanji)} kanji over {len(index.components)} components ({index.words} words per mask)")
+    known = ["一", "口", "木", "日", "人", "女", "子", "土", "ノ", "｜"]
+    print(f"known: {' '.join(known)}")
+    print(f"composable: {' '.join(index.composable(known))}")
+    print(f"missing one: {len(index.frontier(known))}")
+    for component, kanji in sorted(index.next_components(known).items(), key=lambda x: -len(x[1]))[:5]:
+        print(f"  learn {component} → {' '.join(kanji[:12])}{' …' if len(kanji) > 12 else ''}")
+
+    rng = np.random.default_rng(0)
+    learners = [rng.choice(index.components, 40, replace=False).tolist() for _ in range(1000)]
+    start = time.perf_counter()
+    index.batch_frontier(learners)
+    print(f"frontier of 1000 learners in {(time.perf_counter() - start) * 1000:.1f} ms")
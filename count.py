@@ -1,30 +1,82 @@
 import time
 import math
-import matplotlib.pyplot as plt
 from typing import List, Dict, Tuple
-import pandas as pd
-
-
-
-def merge_and_count(left: List[int], right: List[int]) -> Tuple[List[int], int]:
-    merged = []
-    i = j = inv_count = 0
-    while i < len(left) and j < len(right):
-        if left[i] <= right[j]:
-            merged.append(left[i]); i += 1
-        else:
-            merged.append(right[j]); inv_count += len(left) - i; j += 1
-    merged.extend(left[i:]); merged.extend(right[j:])
-    return merged, inv_count
-
-def count_inversions(arr: List[int]) -> Tuple[List[int], int]:
-    if len(arr) <= 1:
-        return arr, 0
-    mid = len(arr) // 2
-    left, invL = count_inversions(arr[:mid])
-    right, invR = count_inversions(arr[mid:])
-    merged, invC = merge_and_count(left, right)
-    return merged, invL + invR + invC
+import bisect
+import multiprocessing
+from dataclasses import dataclass
+import numpy as np
+from parsing import read_metrics
+from scoring import difficulty_scores, ORDER_WEIGHTS
+from instrumentation import search_stats
+from pools import process_pool
+
+
+
+def count_inversions(arr: List[int], stats: search_stats = None) -> Tuple[List[int], int]:
+    """
+    Bottom up merge sort, returns (sorted copy, inversion count).
+    Runs of width 1, 2, 4, ... are merged back and forth between two buffers
+    so nothing is sliced or allocated per level
+    stats: optional search_stats, gets levels/merges/comparisons under "count_inversions"
+    """
+    start = time.perf_counter() if stats else 0
+    levels = merges = comparisons = 0
+    n = len(arr)
+    src = list(arr)
+    dst = [0] * n
+    inv_count = 0
+    width = 1
+    while width < n:
+        levels += 1
+        for lo in range(0, n, 2 * width):
+            mid = min(lo + width, n)
+            hi = min(lo + 2 * width, n)
+            i, j, k = lo, mid, lo
+            merges += 1
+            while i < mid and j < hi:
+                if src[i] <= src[j]:
+                    dst[k] = src[i]; i += 1
+                else:
+                    dst[k] = src[j]; inv_count += mid - i; j += 1
+                k += 1
+            comparisons += k - lo
+            dst[k:k + mid - i] = src[i:mid]
+            k += mid - i
+            dst[k:k + hi - j] = src[j:hi]
+        src, dst = dst, src
+        width *= 2
+    if stats:
+        stats.record("count_inversions", {"sort": time.perf_counter() - start},
+                     elements=n, levels=levels, merges=merges, comparisons=comparisons,
+                     inversions=inv_count)
+    return src, inv_count
+
+def prefix_inversions(arr: List[int]) -> List[int]:
+    """
+    Inversion count of every prefix in one pass: result[i] is the number of
+    inversions in arr[:i+1]. A Fenwick tree over the ranks of the values
+    counts how many earlier elements are greater than each new one
+    """
+    ranks = {v: r for r, v in enumerate(sorted(set(arr)), start=1)}
+    size = len(ranks)
+    tree = [0] * (size + 1)
+    counts = []
+    total = 0
+    for seen, value in enumerate(arr):
+        r = ranks[value]
+        #earlier elements <= value
+        not_greater = 0
+        i = r
+        while i > 0:
+            not_greater += tree[i]
+            i -= i & -i
+        total += seen - not_greater
+        counts.append(total)
+        i = r
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    return counts
 
 
 def load_external_order(path: str) -> List[str]:
@@ -33,30 +85,19 @@ def load_external_order(path: str) -> List[str]:
     order = [line.split(",")[0][0] for line in lines]  # first Kanji only
     return order
 
-def load_kanji_difficulty(metrics_path: str) -> Dict[str, float]:
-    df = pd.read_csv(metrics_path, dtype={"Kanji": str})
-    df.rename(
-        columns={
-            "Kanji": "kanji",
-            "Strokes": "strokes",
-            "Grade": "grade",
-            "JLPT-test": "jlpt",
-            "Kanji Frequency without Proper Nouns": "kfreq",
-        },
-        inplace=True,
-    )
+def load_kanji_difficulty(metrics_path: str, loader: str = "csv") -> Dict[str, float]:
+    """Difficulty of every kanji in the metrics csv (loader: see parsing.read_metrics)"""
+    kanji, strokes, grade, jlpt, kfreq = [], [], [], [], []
+    for chunk in read_metrics(metrics_path, loader=loader):
+        kanji += chunk["Kanji"]
+        strokes += chunk["Strokes"]
+        grade += chunk["Grade"]
+        jlpt += chunk["JLPT-test"]
+        kfreq += chunk["Kanji Frequency without Proper Nouns"]
 
-    df["difficulty"] = df.apply(
-        lambda r: (
-            0.2 * (r["strokes"] / 29.0) +
-            0.2 * (r["grade"] / 7.0) +
-            0.3 * ((6 - r["jlpt"]) / 5.0) +
-            0.2 * (1.0 / (r["kfreq"] + 1) if r["kfreq"] > 0 else 1.0)
-        ),
-        axis=1
-    )
+    difficulty = difficulty_scores(strokes, grade, jlpt, kfreq, ORDER_WEIGHTS, jlpt_scale=5.0)
 
-    return {r["kanji"]: r["difficulty"] for _, r in df.iterrows()}
+    return dict(zip(kanji, difficulty.tolist()))
 
 
 def experiment_runtime(metrics_path: str, order_path: str):
@@ -85,7 +126,27 @@ def experiment_runtime(metrics_path: str, order_path: str):
 
 
 
+def prefix_inversion_rates(metrics_path: str, order_path: str, step: int = 100):
+    """
+    Inversion rate of the first n kanji of an order for n = step, 2*step, ...
+    all from a single prefix_inversions pass instead of one count per n
+    """
+    difficulty_map = load_kanji_difficulty(metrics_path)
+    ext_order = load_external_order(order_path)
+
+    shared = [k for k in ext_order if k in difficulty_map]
+    sorted_kanji = sorted(shared, key=lambda k: difficulty_map[k])
+    rank_map = {k: i for i, k in enumerate(sorted_kanji)}
+    counts = prefix_inversions([rank_map[k] for k in shared])
+
+    n_values = list(range(step, len(shared) + 1, step))
+    #a prefix of one kanji has no pairs, rate 0 like compare_orders
+    rates = [counts[n - 1] / (n * (n - 1) / 2) if n > 1 else 0 for n in n_values]
+    return n_values, rates
+
+
 def plot_runtime(n_values, times):
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(8, 5))
     plt.scatter(n_values, times, label="Measured runtime", color="blue")
 
@@ -114,7 +175,7 @@ def compare_orders(metrics_path: str, order_files: Dict[str, str]):
         shared = [k for k in ext_order if k in rank_map]
         arr = [rank_map[k] for k in shared]
 
-        _, inversions = count_inversions(arr)
+        inversions = prefix_inversions(arr)[-1] if arr else 0
         total_pairs = len(arr) * (len(arr) - 1) / 2
         inversion_rate = inversions / total_pairs if total_pairs > 0 else 0
 
@@ -124,6 +185,137 @@ def compare_orders(metrics_path: str, order_files: Dict[str, str]):
         print(f"Inversion rate: {inversion_rate:.4f} ({inversion_rate*100:.2f}%)\n")
 
 
+def batch_inversions(ranks: np.ndarray) -> np.ndarray:
+    """
+    Inversion count of every row of an (M, n) integer matrix at once.
+    NumPy bottom up merge: at each level both halves of every block are
+    sorted, a stable argsort merges them for all blocks of all rows together,
+    and a right half element that lands at merged position p after coming
+    from position q jumped over exactly q - p greater left half elements
+    """
+    ranks = np.atleast_2d(np.asarray(ranks, dtype=np.int64))
+    rows, n = ranks.shape
+    if n < 2:
+        return np.zeros(rows, dtype=np.int64)
+    size = 1 << (n - 1).bit_length()
+    #padding is larger than every value and sits at the end, so it adds no inversions
+    work = np.full((rows, size), int(ranks.max()) + 1, dtype=np.int64)
+    work[:, :n] = ranks
+    counts = np.zeros(rows, dtype=np.int64)
+    width = 1
+    while width < size:
+        blocks = work.reshape(rows, -1, 2 * width)
+        order = np.argsort(blocks, axis=2, kind="stable")
+        moved = (order - np.arange(2 * width)) * (order >= width)
+        counts += moved.reshape(rows, -1).sum(axis=1)
+        work = np.take_along_axis(blocks, order, axis=2).reshape(rows, size)
+        width *= 2
+    return counts
+
+def longest_increasing_subsequence(arr) -> int:
+    """Length of the longest strictly increasing subsequence (patience sorting)"""
+    tails = []
+    for value in arr:
+        i = bisect.bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+        else:
+            tails[i] = value
+    return len(tails)
+
+def window_inversion_rates(ranks: np.ndarray, window: int) -> np.ndarray:
+    """
+    Inversion rate inside each consecutive block of `window` positions for
+    every row of an (M, n) matrix, shape (M, n // window). The last partial
+    block is dropped
+    """
+    ranks = np.atleast_2d(ranks)
+    blocks = ranks.shape[1] // window
+    if blocks == 0 or window < 2:
+        return np.zeros((ranks.shape[0], 0))
+    b = ranks[:, :blocks * window].reshape(ranks.shape[0], blocks, window)
+    upper = np.triu(np.ones((window, window), dtype=bool), k=1)
+    inversions = ((b[:, :, :, None] > b[:, :, None, :]) & upper).sum(axis=(2, 3))
+    return inversions / (window * (window - 1) / 2)
+
+@dataclass
+class order_comparison:
+    """
+    Result of compare_order_matrix, matrices are (orders × rankings).
+    window_rates[i] is the (rankings × windows) matrix of order i
+    """
+    order_names: List[str]
+    ranking_names: List[str]
+    shared: np.ndarray
+    kendall_tau: np.ndarray
+    kendall_tau_rate: np.ndarray
+    footrule: np.ndarray
+    footrule_rate: np.ndarray
+    lis: np.ndarray
+    window_rates: List[np.ndarray]
+
+def _rank_matrix(order: List[str], rankings: List[Dict[str, float]]):
+    """
+    Kanji of the order known to every ranking, and their (M, n) rank matrix:
+    row m holds the difficulty rank (among the shared kanji) under ranking m,
+    listed in the order's sequence. Ties keep the ranking's own key order,
+    same as compare_orders
+    """
+    shared = [k for k in order if all(k in r for r in rankings)]
+    ranks = np.zeros((len(rankings), len(shared)), dtype=np.int64)
+    for m, ranking in enumerate(rankings):
+        position = {k: i for i, k in enumerate(ranking)}
+        difficulty = np.array([ranking[k] for k in shared], dtype=np.float64)
+        tiebreak = np.array([position[k] for k in shared], dtype=np.int64)
+        ranks[m, np.lexsort((tiebreak, difficulty))] = np.arange(len(shared))
+    return shared, ranks
+
+def _compare_one_order(order: List[str], rankings: List[Dict[str, float]], window: int):
+    shared, ranks = _rank_matrix(order, rankings)
+    n = len(shared)
+    pairs = n * (n - 1) / 2
+    tau = batch_inversions(ranks)
+    footrule = np.abs(ranks - np.arange(n)).sum(axis=1)
+    max_footrule = (n * n) // 2
+    lis = np.array([longest_increasing_subsequence(row) for row in ranks.tolist()], dtype=np.int64)
+    return (n, tau, tau / pairs if pairs else np.zeros(len(rankings)),
+            footrule, footrule / max_footrule if max_footrule else np.zeros(len(rankings)),
+            lis, window_inversion_rates(ranks, window))
+
+def compare_order_matrix(orders: Dict[str, List[str]], rankings: Dict[str, Dict[str, float]],
+                         window: int = 100, workers: int = None) -> order_comparison:
+    """
+    Compare N orderings (name → kanji list, e.g. from load_external_order)
+    against M difficulty rankings (name → {kanji: difficulty}, e.g. from
+    load_kanji_difficulty). All rankings of one order are scored together as
+    one rank matrix and the orders are spread over a process pool
+    """
+    order_names = list(orders)
+    ranking_names = list(rankings)
+    ranking_list = [rankings[name] for name in ranking_names]
+    order_list = [orders[name] for name in order_names]
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(order_list))
+    if workers <= 1:
+        results = [_compare_one_order(o, ranking_list, window) for o in order_list]
+    else:
+        with process_pool(workers) as pool:
+            results = list(pool.map(_compare_one_order, order_list,
+                                    [ranking_list] * len(order_list), [window] * len(order_list)))
+
+    return order_comparison(
+        order_names=order_names,
+        ranking_names=ranking_names,
+        shared=np.array([r[0] for r in results], dtype=np.int64),
+        kendall_tau=np.vstack([r[1] for r in results]),
+        kendall_tau_rate=np.vstack([r[2] for r in results]),
+        footrule=np.vstack([r[3] for r in results]),
+        footrule_rate=np.vstack([r[4] for r in results]),
+        lis=np.vstack([r[5] for r in results]),
+        window_rates=[r[6] for r in results]
+    )
 
 
 if __name__ == "__main__":
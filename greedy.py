@@ -1,12 +1,12 @@
 import heapq
 import time
 import random
-import matplotlib.pyplot as plt
 import math
-import heapdict
-from parsing import parse_raw_data
+from compiled import compiled_graph, compile_graph, compiled_for
+from radix import dijkstras_radix
+from instrumentation import search_stats
 
-def measure_runtime(kanji_dict, trials=5):
+def measure_runtime(kanji_dict, trials=5, backend="heap"):
     sizes = [100, 300, 600, 1000, 1500, len(kanji_dict)]
     results = []
 
@@ -16,14 +16,17 @@ def measure_runtime(kanji_dict, trials=5):
         if n > len(kanji_dict):
             break
         subset_keys = set(random.sample(all_kanji, n))
-        subgraph = {k: v for k, v in kanji_dict.items() if k in subset_keys}
+        if isinstance(kanji_dict, compiled_graph):
+            subgraph = kanji_dict.subgraph(subset_keys)
+        else:
+            subgraph = {k: v for k, v in kanji_dict.items() if k in subset_keys}
         
         source = random.choice(list(subgraph.keys()))
 
         total_time = 0.0
         for _ in range(trials):
             start = time.perf_counter()
-            dijkstras(source, subgraph)
+            dijkstras(source, subgraph, backend=backend)
             end = time.perf_counter()
             total_time += (end - start)
         
@@ -38,6 +41,7 @@ def measure_runtime(kanji_dict, trials=5):
     return results
 
 def plot_runtime(results):
+    import matplotlib.pyplot as plt
     vertices = [r[0] for r in results]
     runtimes = [r[1] for r in results]
 
@@ -57,16 +61,38 @@ def plot_runtime(results):
     plt.tight_layout()
     plt.show()
 
-def dijkstras(source_kanji: str, kanji_dict: dict):
+def dijkstras(source_kanji: str, kanji_dict: dict, target_kanji: str = None, backend: str = "heap",
+              stats: search_stats = None):
+    """
+    Single source Dijkstra over the whole graph. If target_kanji is given the
+    single pair mode is used instead and the search stops once it is settled.
+    backend "radix" runs on the compiled graph with a radix heap (see radix.py),
+    for a kanji dict the result is keyed by kanji like the heap backend's
+    stats: optional search_stats, gets the counters of the search under "dijkstras"
+    """
+    if backend == "radix":
+        graph = compiled_for(kanji_dict)
+        distances, predecessors = dijkstras_radix(source_kanji, graph, target_kanji, stats)
+        if distances is None or graph is kanji_dict:
+            return distances, predecessors
+        return _keyed_by_kanji(graph, distances, predecessors, reached_only=target_kanji is not None)
+    if backend != "heap":
+        raise ValueError(f"unknown priority queue backend: {backend}")
+    if isinstance(kanji_dict, compiled_graph):
+        return dijkstras_compiled(source_kanji, kanji_dict, target_kanji, stats)
+    if target_kanji is not None:
+        return dijkstras_point_to_point(source_kanji, target_kanji, kanji_dict, stats)
     if source_kanji not in kanji_dict:
         print(f"Error : {source_kanji} not found in kanji dictionary")
         return None, None
+    start = time.perf_counter() if stats else 0
     
     #create a set of infinite distances for each node(except source=0)
     distances = {}
     #create a null set of predecessors for each node 
     predecessors = {}
     #create empty priority queue pq
+    import heapdict
     pq = heapdict.heapdict()
     for kanji in kanji_dict:
         if kanji == source_kanji:
@@ -79,17 +105,22 @@ def dijkstras(source_kanji: str, kanji_dict: dict):
         #for each vertice in vertices, insert (v, dist(v)) (infinity for now)
         
     
+    pushes = len(pq)
+    settled = relaxed = decreases = 0
+    init_done = time.perf_counter() if stats else 0
 
     # while pq is not empty
     while pq:
         #get the vertex (u) with the shortest distance to source(first iteration is the source)
-        current_dist, u = pq.popitem()
+        u, current_dist = pq.popitem()
         #since we might come accros repeated vertices in the pq, check the updated distance 
 
         
         kanji_obj = kanji_dict.get(u)
         if not kanji_obj:
             continue
+        settled += 1
+        relaxed += len(kanji_obj.composed)
         #for each edge (u,v) starting from u 
         for v, edge_weight in kanji_obj.composed:
             if v not in kanji_dict:
@@ -100,9 +131,131 @@ def dijkstras(source_kanji: str, kanji_dict: dict):
                 distances[v] = new_dist
                 pq[v] = new_dist
                 predecessors[v] = u
-                
+                decreases += 1
+
+    if stats:
+        stats.record("dijkstras", {"init": init_done - start, "search": time.perf_counter() - init_done},
+                     settled=settled, edges_relaxed=relaxed, decreases=decreases,
+                     pushes=pushes, pops=settled, stale_pops=0)
+    return distances, predecessors
+
+def _keyed_by_kanji(graph: compiled_graph, distances: list, predecessors: list, reached_only: bool):
+    """
+    Id indexed search result as kanji keyed dicts. reached_only: keep only
+    reached vertices like dijkstras_point_to_point, else every vertex like dijkstras
+    """
+    kanji = graph.kanji
+    ids = [u for u, d in enumerate(distances) if d != float('inf')] if reached_only else range(len(kanji))
+    return ({kanji[u]: distances[u] for u in ids},
+            {kanji[u]: kanji[predecessors[u]] if predecessors[u] >= 0 else None for u in ids})
+
+def dijkstras_point_to_point(source_kanji: str, target_kanji: str, kanji_dict: dict,
+                             stats: search_stats = None):
+    """
+    Single pair Dijkstra. Vertices are pushed lazily into a heapq (no upfront
+    inf entries), stale entries are skipped when popped and the search returns
+    as soon as the target is settled. distances/predecessors only hold the
+    vertices that were reached
+    """
+    if source_kanji not in kanji_dict:
+        print(f"Error : {source_kanji} not found in kanji dictionary")
+        return None, None
+
+    start = time.perf_counter() if stats else 0
+    distances = {source_kanji: 0}
+    predecessors = {source_kanji: None}
+    settled = set()
+    pq = [(0, source_kanji)]
+    relaxed = decreases = 0
+    while pq:
+        current_dist, u = heapq.heappop(pq)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u == target_kanji:
+            break
+        composed = kanji_dict[u].composed
+        relaxed += len(composed)
+        for v, edge_weight in composed:
+            if v not in kanji_dict:
+                continue
+            new_dist = current_dist + edge_weight
+            if new_dist < distances.get(v, float('inf')):
+                distances[v] = new_dist
+                predecessors[v] = u
+                heapq.heappush(pq, (new_dist, v))
+                decreases += 1
+
+    if stats:
+        _record_lazy_search(stats, start, len(settled), relaxed, decreases, len(pq))
     return distances, predecessors
 
+def _record_lazy_search(stats, start, settled, relaxed, decreases, left_in_queue):
+    """Counters of a lazy heap search: every decrease is a push, the source is the first one"""
+    pushes = decreases + 1
+    pops = pushes - left_in_queue
+    stats.record("dijkstras", {"search": time.perf_counter() - start},
+                 settled=settled, edges_relaxed=relaxed, decreases=decreases,
+                 pushes=pushes, pops=pops, stale_pops=pops - settled)
+
+def dijkstras_compiled(source_kanji: str, graph: compiled_graph, target_kanji: str = None,
+                       stats: search_stats = None):
+    """
+    Dijkstra over the CSR arrays, works on integer ids only.
+    Returns distances and predecessors as lists indexed by kanji id
+    (graph.kanji[i] is the kanji of id i, -1 means no predecessor)
+    With target_kanji the search stops once the target is settled
+    """
+    source = graph.index.get(source_kanji)
+    if source is None:
+        print(f"Error : {source_kanji} not found in kanji dictionary")
+        return None, None
+    target = graph.index.get(target_kanji, -1)
+    start = time.perf_counter() if stats else 0
+
+    #memoryviews index to plain python numbers without copying the arrays
+    offsets = memoryview(graph.offsets)
+    neighbors = memoryview(graph.neighbors)
+    weights = memoryview(graph.weights)
+
+    distances = [float('inf')] * graph.num_nodes
+    predecessors = [-1] * graph.num_nodes
+    distances[source] = 0
+    pq = [(0, source)]
+    settled = relaxed = decreases = 0
+    while pq:
+        current_dist, u = heapq.heappop(pq)
+        #stale entry, u was already settled with a shorter distance
+        if current_dist > distances[u]:
+            continue
+        settled += 1
+        if u == target:
+            break
+        lo, hi = offsets[u], offsets[u + 1]
+        relaxed += hi - lo
+        for i in range(lo, hi):
+            v = neighbors[i]
+            new_dist = current_dist + weights[i]
+            if new_dist < distances[v]:
+                distances[v] = new_dist
+                predecessors[v] = u
+                heapq.heappush(pq, (new_dist, v))
+                decreases += 1
+
+    if stats:
+        _record_lazy_search(stats, start, settled, relaxed, decreases, len(pq))
+    return distances, predecessors
+
+def reconstruct_path_ids(target: int, predecessors: list):
+    path = []
+    current = target
+    while current != -1:
+        path.append(current)
+        current = predecessors[current]
+
+    path.reverse()
+    return path
+
 def reconstruct_path(target_kanji: str, predecessors: dict):
     if target_kanji not in predecessors: return None
     path = []
@@ -114,24 +267,144 @@ def reconstruct_path(target_kanji: str, predecessors: dict):
     path.reverse()
     return path
 
-def find_learning_path(source_kanji: str, target_kanji: str, kanji_dict: dict):
-    distances, predecessors = dijkstras(source_kanji, kanji_dict)
-    
-    if distances is None:
-        return None, None
-    
-    if target_kanji not in distances:
+def find_learning_path(source_kanji: str, target_kanji: str, kanji_dict: dict, engine: str = "dijkstra",
+                       stats: search_stats = None):
+    """
+    Cheapest path from source to target and its total weight.
+    engine: "dijkstra" (single pair Dijkstra), "alt" (A* with landmarks, see alt.py)
+    or "ch" (contraction hierarchy, see ch.py)
+    or "cache" (cached shortest path tree of the source, see tree_cache.py)
+    stats: optional search_stats, only filled by the "dijkstra" engine
+    (search counters plus search/reconstruct phase times under "find_learning_path")
+    Pairs without a path are rejected by the reachability index of the graph
+    (see reachability.py, a dict uses its compiled form) before any engine runs
+    """
+    if engine not in ("dijkstra", "alt", "ch", "cache"):
+        raise ValueError(f"unknown search engine: {engine}")
+    graph = compiled_for(kanji_dict)
+    if source_kanji in graph.index and target_kanji in graph.index:
+        from reachability import get_reachability_index
+        if not get_reachability_index(graph).reachable(graph.index[source_kanji], graph.index[target_kanji]):
+            if stats:
+                stats.record("find_learning_path", queries=1, found=0, rejected=1, path_length=0)
+            print(f"No path exists from {source_kanji} to {target_kanji}")
+            return None, None
+
+    if engine == "cache":
+        from tree_cache import default_tree_cache
+        return default_tree_cache.find_learning_path(source_kanji, target_kanji, kanji_dict)
+    if engine == "alt":
+        from alt import find_learning_path_alt
+        return find_learning_path_alt(source_kanji, target_kanji, kanji_dict)
+    if engine == "ch":
+        from ch import find_learning_path_ch
+        return find_learning_path_ch(source_kanji, target_kanji, kanji_dict)
+
+    if target_kanji not in kanji_dict:
         print(f"Error: {target_kanji} not found in dictionary")
         return None, None
+
+    start = time.perf_counter() if stats else 0
+    distances, predecessors = dijkstras(source_kanji, kanji_dict, target_kanji, stats=stats)
+    searched = time.perf_counter() if stats else 0
     
-    if distances[target_kanji] == float('inf'):
+    if distances is None:
+        return None, None
+
+    if isinstance(kanji_dict, compiled_graph):
+        target = kanji_dict.index[target_kanji]
+        if distances[target] == float('inf'):
+            path, total_difficulty = None, None
+        else:
+            path = [kanji_dict.kanji[i] for i in reconstruct_path_ids(target, predecessors)]
+            total_difficulty = distances[target]
+    elif distances.get(target_kanji, float('inf')) == float('inf'):
+        path, total_difficulty = None, None
+    else:
+        path = reconstruct_path(target_kanji, predecessors)
+        total_difficulty = distances[target_kanji]
+
+    if stats:
+        stats.record("find_learning_path",
+                     {"search": searched - start, "reconstruct": time.perf_counter() - searched},
+                     queries=1, found=int(path is not None), path_length=len(path) if path else 0)
+    if path is None:
         print(f"No path exists from {source_kanji} to {target_kanji}")
         return None, None
-    
-    path = reconstruct_path(target_kanji, predecessors)
-    total_difficulty = distances[target_kanji]
-    
     return path, total_difficulty
+
+#graph of a find_learning_paths (or service.py) worker process, set once by _init_path_worker
+_worker_graph = None
+
+def _init_path_worker(graph):
+    """graph: the compiled graph, or a shared_graph_handle to attach to"""
+    global _worker_graph
+    if not isinstance(graph, compiled_graph):
+        from shared_graph import attach_graph
+        graph = attach_graph(graph)
+    _worker_graph = graph
+
+def _paths_from_source(source_kanji: str, target_kanjis: list, graph: compiled_graph = None):
+    """One full search from source, answers every target with (path, weight)"""
+    graph = graph if graph is not None else _worker_graph
+    if source_kanji not in graph.index:
+        return [(None, None)] * len(target_kanjis)
+    distances, predecessors = dijkstras_compiled(source_kanji, graph)
+    results = []
+    for target_kanji in target_kanjis:
+        target = graph.index.get(target_kanji)
+        if target is None or distances[target] == float('inf'):
+            results.append((None, None))
+        else:
+            path = [graph.kanji[i] for i in reconstruct_path_ids(target, predecessors)]
+            results.append((path, distances[target]))
+    return results
+
+def find_learning_paths(pairs, kanji_dict, workers: int = None, shared: bool = False,
+                        start_method: str = None):
+    """
+    Batch version of find_learning_path for many (source, target) pairs.
+    Pairs are grouped by source so one search answers all targets of that
+    source, and distinct sources are spread over a process pool. Workers get
+    the compiled graph when the pool starts (inherited by fork where available)
+    instead of parsing the data themselves.
+    shared: publish the graph in shared memory (see shared_graph.py) and have
+    the workers attach to it, one copy of the arrays whatever the start method
+    start_method: multiprocessing start method, fork where available by default
+    Returns (path, weight) per pair in input order, (None, None) if there is no path
+    """
+    graph = kanji_dict if isinstance(kanji_dict, compiled_graph) else compile_graph(kanji_dict)
+    pairs = list(pairs)
+    groups = {}
+    for i, (source, target) in enumerate(pairs):
+        groups.setdefault(source, []).append(i)
+    sources = list(groups)
+    target_lists = [[pairs[i][1] for i in groups[source]] for source in sources]
+
+    import multiprocessing
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(sources))
+    if workers <= 1:
+        answers = [_paths_from_source(s, t, graph) for s, t in zip(sources, target_lists)]
+    else:
+        from contextlib import nullcontext
+        from pools import process_pool
+        if shared:
+            from shared_graph import publish_graph
+            published = publish_graph(graph)
+        with published if shared else nullcontext():
+            with process_pool(workers, _init_path_worker, (published.handle if shared else graph,),
+                              start_method) as pool:
+                chunksize = max(1, len(sources) // (workers * 4))
+                answers = list(pool.map(_paths_from_source, sources, target_lists, chunksize=chunksize))
+
+    results = [None] * len(pairs)
+    for source, answer in zip(sources, answers):
+        for i, result in zip(groups[source], answer):
+            results[i] = result
+    return results
+
 def find_example_paths(kanji_dict):
     examples = [
         ("一", "謝"),  
@@ -169,18 +442,28 @@ def find_example_paths(kanji_dict):
 
 
 if __name__ == "__main__":
-    kanji_metrics_dict = parse_raw_data()
-    print(f"Loaded {len(kanji_metrics_dict)} kanji\n")
+    from snapshot import load_graph
+    kanji_graph = load_graph()
+    print(f"Loaded {len(kanji_graph)} kanji\n")
     #
-    paths, path_info, all_nodes = find_example_paths(kanji_metrics_dict)
+    paths, path_info, all_nodes = find_example_paths(kanji_graph)
     
     if not paths:
         print("No paths found!")
     else:
         print(f"\nFound {len(paths)} paths with {len(all_nodes)} unique kanji")
     
-    results = measure_runtime(kanji_metrics_dict)
+    from parsing import parse_raw_data
+    results = measure_runtime(parse_raw_data())
     plot_runtime(results)
+
+    #same benchmark on the compiled (CSR) graph
+    compiled_results = measure_runtime(kanji_graph)
+    plot_runtime(compiled_results)
+
+    #compiled graph with the radix heap backend
+    radix_results = measure_runtime(kanji_graph, backend="radix")
+    plot_runtime(radix_results)
     # Example 1: Find path from simple kanji to complex kanji
     #source = "験" 
     #target = "賢"  
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+
+class search_stats:
+    """
+    Opt in counters and phase timings. Pass an instance as `stats=` to
+    dijkstras, find_learning_path, parse_raw_data or count_inversions; with
+    stats=None (the default) nothing is recorded. Counters are keyed
+    "<scope>.<name>" and summed over calls, phases are wall time in seconds.
+    callback(scope, values) is called once per instrumented call with that
+    call's own counters and phase times.
+    """
+    def __init__(self, callback=None):
+        self.counters = {}
+        self.phases = {}
+        self.callback = callback
+
+    def record(self, scope: str, phases: dict = None, **counters):
+        for name, value in counters.items():
+            key = f"{scope}.{name}"
+            self.counters[key] = self.counters.get(key, 0) + value
+        for name, seconds in (phases or {}).items():
+            key = f"{scope}.{name}"
+            self.phases[key] = self.phases.get(key, 0.0) + seconds
+        if self.callback is not None:
+            self.callback(scope, {**counters, **{f"{name}_s": s for name, s in (phases or {}).items()}})
+
+    @contextmanager
+    def phase(self, scope: str, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(scope, {name: time.perf_counter() - start})
+
+    def reset(self):
+        self.counters.clear()
+        self.phases.clear()
+
+    def as_dict(self):
+        return {"counters": dict(self.counters), "phases": dict(self.phases)}
+
+    def report(self):
+        lines = [f"{name:40s} {value}" for name, value in sorted(self.counters.items())]
+        lines += [f"{name:40s} {seconds * 1000:.3f} ms" for name, seconds in sorted(self.phases.items())]
+        return "\n".join(lines)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict, deque
+import numpy as np
+
+# Node positions for the plots. layout_cache remembers computed layouts by
+# node set and parameters (in memory, and on disk when given a directory) and
+# lays out a grown node set incrementally: the nodes of the largest cached
+# subset keep their positions and only the new nodes are placed by the spring
+# model. layered_layout is the cheap alternative, columns by stroke count or
+# by depth along the learning paths.
+
+LAYOUT_CACHE_DIR = "layout_cache"
+
+def _digest(text: str):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def compute_layout(G, method: str = "spring", seed: int = 42, k: float = 2, iterations: int = 50,
+                   pos: dict = None, fixed=None):
+    """
+    {node: (x, y)} for G. method "spring" (kamada_kawai if spring fails) or
+    "kamada_kawai". pos / fixed: starting positions and the nodes that keep them
+    """
+    import networkx as nx
+    if method == "kamada_kawai":
+        return nx.kamada_kawai_layout(G)
+    if method != "spring":
+        raise ValueError(f"unknown layout method: {method}")
+    try:
+        return nx.spring_layout(G, k=k, iterations=iterations, seed=seed, pos=pos, fixed=fixed)
+    except Exception:
+        return nx.kamada_kawai_layout(G)
+
+class layout_cache:
+    """
+    LRU of layouts keyed by (node set, method, parameters). With a directory
+    every layout is also saved there as .npz, so later runs start warm.
+    """
+    def __init__(self, directory: str = None, max_layouts: int = 64):
+        self.directory = directory
+        self.max_layouts = max_layouts
+        self.layouts = OrderedDict()
+        self.hits = 0
+        self.incremental = 0
+        self.misses = 0
+
+    def _params_key(self, method: str, params: dict):
+        return _digest(json.dumps([method, sorted(params.items())], default=str))
+
+    def _file(self, params_key: str, nodes_key: str):
+        return os.path.join(self.directory, f"{params_key}-{nodes_key}.npz")
+
+    def _remember(self, key, nodes, positions):
+        self.layouts[key] = (nodes, positions)
+        self.layouts.move_to_end(key)
+        while len(self.layouts) > self.max_layouts:
+            self.layouts.popitem(last=False)
+
+    def _candidates(self, params_key: str):
+        """(nodes, positions) of every known layout with these parameters"""
+        seen = set()
+        for (p, n), value in list(self.layouts.items()):
+            if p == params_key:
+                seen.add(n)
+                yield value
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.startswith(params_key + "-") and name[len(params_key) + 1:-4] not in seen:
+                    with np.load(os.path.join(self.directory, name)) as data:
+                        yield data["nodes"].tolist(), data["positions"]
+
+    def layout(self, G, method: str = "spring", incremental_iterations: int = 20, **params):
+        """
+        {node: (x, y)} for G. Exact node set seen before: the stored layout.
+        Otherwise the largest stored subset with the same parameters stays
+        fixed and only the remaining nodes are laid out, starting next to their
+        placed neighbors; from scratch when no subset is known
+        """
+        nodes = sorted(G.nodes())
+        params_key = self._params_key(method, params)
+        nodes_key = _digest("\n".join(nodes))
+        key = (params_key, nodes_key)
+        if key in self.layouts:
+            self.hits += 1
+            self.layouts.move_to_end(key)
+            return dict(zip(nodes, map(tuple, self.layouts[key][1])))
+        if self.directory and os.path.exists(self._file(params_key, nodes_key)):
+            self.hits += 1
+            with np.load(self._file(params_key, nodes_key)) as data:
+                positions = data["positions"]
+            self._remember(key, nodes, positions)
+            return dict(zip(nodes, map(tuple, positions)))
+
+        node_set = set(nodes)
+        best = None
+        for cached_nodes, positions in self._candidates(params_key):
+            if len(cached_nodes) < len(nodes) and node_set.issuperset(cached_nodes):
+                if best is None or len(cached_nodes) > len(best[0]):
+                    best = (cached_nodes, positions)
+
+        if best is None or method != "spring":
+            self.misses += 1
+            pos = compute_layout(G, method, **params)
+        else:
+            self.incremental += 1
+            pos = {node: tuple(xy) for node, xy in zip(best[0], best[1])}
+            rng = np.random.default_rng(params.get("seed", 42))
+            #new nodes start at the mean of their placed neighbors (or the
+            #center), placing them in breadth first order from the fixed part
+            queue = deque(n for n in nodes if n not in pos)
+            waited = 0
+            while queue:
+                node = queue.popleft()
+                placed = [pos[v] for v in set(G.predecessors(node)) | set(G.successors(node)) if v in pos] \
+                    if G.is_directed() else [pos[v] for v in G.neighbors(node) if v in pos]
+                if not placed and waited < len(queue):
+                    queue.append(node)
+                    waited += 1
+                    continue
+                waited = 0
+                center = np.mean(placed, axis=0) if placed else np.zeros(2)
+                pos[node] = tuple(center + rng.normal(scale=0.05, size=2))
+            fixed = [n for n in best[0]]
+            step = dict(params, iterations=incremental_iterations)
+            pos = compute_layout(G, method, pos=pos, fixed=fixed, **step)
+
+        positions = np.array([pos[n] for n in nodes], dtype=np.float64)
+        self._remember(key, nodes, positions)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            np.savez(self._file(params_key, nodes_key), nodes=np.array(nodes), positions=positions)
+        return {n: tuple(p) for n, p in zip(nodes, positions)}
+
+    def stats(self):
+        return {"layouts": len(self.layouts), "hits": self.hits,
+                "incremental": self.incremental, "misses": self.misses}
+
+#shared cache behind create_interactive_plot
+default_layout_cache = layout_cache()
+
+def path_depths(G, paths):
+    """
+    Depth of every node of G: its smallest index along a path, nodes off the
+    paths get the depth of the nearest path node plus the hops to it (BFS)
+    """
+    depth = {}
+    for path in paths:
+        for i, node in enumerate(path or []):
+            if node in G and depth.get(node, i + 1) > i:
+                depth[node] = i
+    queue = deque(sorted(depth, key=depth.get))
+    undirected = G.to_undirected(as_view=True)
+    while queue:
+        u = queue.popleft()
+        for v in undirected.neighbors(u):
+            if v not in depth:
+                depth[v] = depth[u] + 1
+                queue.append(v)
+    return {n: depth.get(n, 0) for n in G.nodes()}
+
+def layered_layout(G, by: str = "strokes", paths=None, key: str = "difficulty"):
+    """
+    {node: (x, y)} in columns: x from the stroke count (by="strokes") or the
+    path depth (by="depth", needs paths), nodes stacked within a column by the
+    node attribute `key`. Linear in nodes and edges apart from the column sort,
+    coordinates scaled to [-1, 1] like the networkx layouts
+    """
+    nodes = list(G.nodes())
+    if not nodes:
+        return {}
+    if by == "strokes":
+        column = np.array([G.nodes[n]["strokes"] for n in nodes], dtype=np.float64)
+    elif by == "depth":
+        depth = path_depths(G, paths or [])
+        column = np.array([depth[n] for n in nodes], dtype=np.float64)
+    else:
+        raise ValueError(f"unknown layering: {by}")
+    within = np.array([G.nodes[n].get(key, 0) for n in nodes], dtype=np.float64)
+    xy = layered_positions(column, within)
+    return {n: (float(px), float(py)) for n, (px, py) in zip(nodes, xy.tolist())}
+
+def layered_positions(column, within):
+    """
+    (n, 2) float64 positions for layered_layout from its two columns: x by
+    `column`, nodes of a column stacked and centered by `within`
+    """
+    column = np.asarray(column, dtype=np.float64)
+    within = np.asarray(within, dtype=np.float64)
+    n = len(column)
+    if n == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    order = np.lexsort((within, column))
+    _, starts, counts = np.unique(column[order], return_index=True, return_counts=True)
+    rank = np.empty(n, dtype=np.float64)
+    rank[order] = np.arange(n) - np.repeat(starts, counts)
+    size = np.empty(n, dtype=np.float64)
+    size[order] = np.repeat(counts, counts)
+    #center each column vertically
+    y = rank - (size - 1) / 2
+    x = column
+    scale = lambda a: (a - (a.max() + a.min()) / 2) / max((a.max() - a.min()) / 2, 1e-12)
+    return np.column_stack([scale(x), scale(y)])
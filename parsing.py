@@ -1,10 +1,13 @@
-import pandas as pd
+import csv
 import json
-import math
-import itertools
+import time
 from dataclasses import dataclass
+import numpy as np
+from scoring import difficulty_scores, edge_weights, GRAPH_WEIGHTS, MAX_STROKES, MAX_GRADE
+from instrumentation import search_stats
 
-@dataclass
+#slotted: no per instance __dict__, the graphs hold thousands of these
+@dataclass(slots=True)
 class kanji_class:
     id: str
     kanji: str
@@ -15,82 +18,222 @@ class kanji_class:
     kfreq: int
     difficulty: float
     composed: list #used to create the directed weighted graph 
+    imputed: tuple = () #names of the metrics that were imputed, see parse_raw_data(include_all=True)
+
+#metrics filled in by impute_metrics for krad literals missing from kanjimetrics.csv
+IMPUTED_FIELDS = ("strokes", "grade", "jlpt", "rfreq", "kfreq")
 
 def calculate_difficulty(strokes, grade, jlpt, kfreq):
     """
     Calculate benefit score as a ratio of difficulty to usability
-    Weights on differnt aspects
+    Weights on differnt aspects (see scoring.difficulty_scores for whole columns)
     """
-    stroke_score = strokes/29.0
-    grade_score = grade/7.0
-    jlpt_score = (6-jlpt)/6.0
-    freq_score = 1.0 / (kfreq + 1) if kfreq > 0 else 1.0
+    return float(difficulty_scores(strokes, grade, jlpt, kfreq, GRAPH_WEIGHTS))
 
-    difficulty = (
-        0.1 * stroke_score +
-        0.1 * grade_score +
-        0.2 * jlpt_score + 
-        0.5 * freq_score
-    )
+def calculate_edge_weight(strokes_v, strokes_u):
+    return float(edge_weights(strokes_v, strokes_u))
 
-    return difficulty
+def iter_json_array(path: str, chunk_size: int = 1 << 16):
+    """
+    Yield the entries of a top level JSON array of objects (krad.json) one at a
+    time, reading chunk_size characters at a time instead of loading the file
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as file:
+        buffer, pos, started = "", 0, False
+        while True:
+            chunk = file.read(chunk_size)
+            buffer, pos = buffer[pos:] + chunk, 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,\ufeff":
+                    pos += 1
+                if pos == len(buffer):
+                    break
+                if not started:
+                    if buffer[pos] != "[":
+                        raise ValueError(f"{path}: expected a JSON array")
+                    started, pos = True, pos + 1
+                    continue
+                if buffer[pos] == "]":
+                    return
+                try:
+                    entry, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    #entry cut off at the end of the chunk, read more
+                    if not chunk:
+                        raise
+                    break
+                yield entry
+            if not chunk:
+                raise ValueError(f"{path}: unterminated JSON array")
+
+def read_metrics(path: str = "kanjimetrics.csv", chunk_size: int = 1 << 16, loader: str = "csv"):
+    """
+    Rows of the metrics csv, chunk_size rows at a time, as {column: list}
+    with the Kanji column as str and every other column as int.
+    loader: "csv" (standard library, no import cost) or "pandas"
+    """
+    if loader == "pandas":
+        import pandas as pd
+        for df in pd.read_csv(path, dtype={"Kanji": str}, chunksize=chunk_size):
+            yield {name: df[name].tolist() for name in df.columns}
+        return
+    if loader != "csv":
+        raise ValueError(f"unknown csv loader: {loader}")
+    with open(path, "r", encoding="utf-8-sig", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        text = [name == "Kanji" for name in header]
+        while True:
+            rows = [row for _, row in zip(range(chunk_size), reader)]
+            if not rows:
+                return
+            yield {name: [value if is_text else int(value) for value in values]
+                   for name, is_text, values in zip(header, text, zip(*rows))}
+
+def parse_raw_data(stats: search_stats = None, include_all: bool = False, chunk_size: int = 1 << 16,
+                   loader: str = "csv"):
+    """
+    include_all: also keep the krad.json literals missing from kanjimetrics.csv,
+    their metrics are imputed (see impute_metrics) and listed in kanji_class.imputed
+    chunk_size: csv rows / json characters read at a time
+    loader: csv reader, see read_metrics
+    stats: optional search_stats, gets the csv_scan/json_load/impute/edge_build
+    phase times and the literal/kanji/edge counts under "parse_raw_data"
+    """
+    marks = [time.perf_counter()] if stats else None
+    #csv first and in chunks, difficulty is scored one chunk of rows at a time
+    columns = {name: [] for name in ("id", "kanji", "strokes", "grade", "jlpt", "rfreq", "kfreq", "difficulty")}
+    for chunk in read_metrics("kanjimetrics.csv", chunk_size, loader):
+        #the radical frequency column is what feeds the frequency term here
+        difficulty = difficulty_scores(chunk['Strokes'], chunk['Grade'], chunk['JLPT-test'], chunk['Radical Freq.'],
+                                       GRAPH_WEIGHTS)
+        columns["id"] += chunk['id']
+        columns["kanji"] += chunk['Kanji']
+        columns["strokes"] += chunk['Strokes']
+        columns["grade"] += chunk['Grade']
+        columns["jlpt"] += chunk['JLPT-test']
+        columns["rfreq"] += chunk['Radical Freq.']
+        columns["kfreq"] += chunk['Kanji Frequency without Proper Nouns']
+        columns["difficulty"] += difficulty.tolist()
+    kanji = columns["kanji"]
+    index = {k: i for i, k in enumerate(kanji)}
+    measured = len(kanji)
+
+    if stats: marks.append(time.perf_counter())
+
+    #single pass over krad: every literal gives an edge to each of its components
+    #and the reverse (composed) edge, both kept only if the two ends are nodes.
+    #the node set can still grow (include_all) so ends are resolved afterwards
+    edge_src, edge_dst, edge_kind = [], [], []
+    extra_components = []
+    measured_components = {}
+    literals = 0
+    for entry in iter_json_array("krad.json", chunk_size):
+        literals += 1
+        literal, components = entry["literal"], entry["components"]
+        if include_all:
+            if literal not in index:
+                index[literal] = len(kanji)
+                kanji.append(literal)
+                extra_components.append(components)
+            elif index[literal] < measured:
+                measured_components[literal] = components
+        for component in components:
+            edge_src.append(literal)
+            edge_dst.append(component)
+            edge_kind.append(1)
+            if component != literal:
+                edge_src.append(component)
+                edge_dst.append(literal)
+                edge_kind.append(0)
+
+    if stats: marks.append(time.perf_counter())
+
+    imputed = impute_metrics(extra_components, measured_components, columns, index)
+    for name, values in imputed.items():
+        columns[name] += values
+
+    if stats: marks.append(time.perf_counter())
+
+    #edges sorted by source, then weight (presorting), ties keep the composed
+    #edges before the component edges and krad order within each
+    src = np.array([index.get(k, -1) for k in edge_src], dtype=np.int64)
+    dst = np.array([index.get(k, -1) for k in edge_dst], dtype=np.int64)
+    keep = (src >= 0) & (dst >= 0)
+    src, dst, kind = src[keep], dst[keep], np.array(edge_kind, dtype=np.int8)[keep]
+    strokes = np.array(columns["strokes"], dtype=np.int64)
+    weights = edge_weights(strokes[src], strokes[dst])
+    order = np.lexsort((np.arange(len(src)), kind, weights, src))
+    offsets = np.zeros(len(kanji) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(kanji)), out=offsets[1:])
+    dst_kanji = [kanji[v] for v in dst[order].tolist()]
+    composed = list(zip(dst_kanji, weights[order].tolist()))
+    bounds = offsets.tolist()
 
-def calculate_edge_weight(strokes_v, strokes_u):
-    weight = math.pow(strokes_v-strokes_u, 4)
-    return weight
-
-def parse_raw_data():
-    json_path = "krad.json"
-    with open(json_path, "r", encoding="utf-8") as file:
-        data = json.load(file)
-    kanji_dict = {entry["literal"]: entry["components"] for entry in data}
-    reverse_dict = {}
-    for k, v in list(kanji_dict.items()):
-        for i in v:
-            if i!=k:
-                reverse_dict.setdefault(i,[]).append(k)
-
-    #what if we take both composed and components ! and calculate the 
-    #first iteration creates all kanji objects 
     kanji_metrics_dict = {}
-    df = pd.read_csv("kanjimetrics.csv")
-    for _, row in df.iterrows():
-        kanji = row['Kanji']
-        composed_kanji = reverse_dict.get(kanji, [])
-        kanji_obj = kanji_class(
-            id = str(row['id']),
-            kanji = kanji,
-            strokes =int(row['Strokes']),
-            grade = int(row['Grade']),
-            jlpt = int(row['JLPT-test']),
-            rfreq= int(row['Radical Freq.']),
-            kfreq= int(row['Kanji Frequency without Proper Nouns']),
-            difficulty=calculate_difficulty(int(row['Strokes']), int(row['Grade']), int(row['JLPT-test']), int(row['Radical Freq.'])),
-            composed = composed_kanji
+    rows = zip(columns["id"], kanji, columns["strokes"], columns["grade"], columns["jlpt"],
+               columns["rfreq"], columns["kfreq"], columns["difficulty"])
+    for u, (id, k, strokes, grade, jlpt, rfreq, kfreq, diff) in enumerate(rows):
+        kanji_metrics_dict[k] = kanji_class(
+            id = str(id),
+            kanji = k,
+            strokes = int(strokes),
+            grade = int(grade),
+            jlpt = int(jlpt),
+            rfreq = int(rfreq),
+            kfreq = int(kfreq),
+            difficulty = diff,
+            composed = composed[bounds[u]:bounds[u + 1]],
+            imputed = IMPUTED_FIELDS if u >= measured else ()
         )
-        kanji_metrics_dict[kanji] = kanji_obj
-
-    #second pass populates composed lists with (kanji, edge_weight) tuple
-    for kanji, kanji_obj in kanji_metrics_dict.items():
-        composed_with_edge= []
-        if kanji in reverse_dict:
-            for composed_kanji in reverse_dict[kanji]:
-                if composed_kanji in kanji_metrics_dict:
-                    target = kanji_metrics_dict[composed_kanji]
-                    edge = calculate_edge_weight(kanji_obj.strokes, target.strokes)
-                    composed_with_edge.append((composed_kanji, edge))
-        if kanji in kanji_dict:
-            for component_kanji in kanji_dict[kanji]:
-                if component_kanji in kanji_metrics_dict:
-                    target = kanji_metrics_dict[component_kanji]
-                    edge = calculate_edge_weight(kanji_obj.strokes, target.strokes)
-                    composed_with_edge.append((component_kanji, edge))
-        #presorting
-        composed_with_edge.sort(key=lambda x: x[1])
-        kanji_obj.composed = composed_with_edge
 
+    if stats:
+        marks.append(time.perf_counter())
+        phases = ["csv_scan", "json_load", "impute", "edge_build"]
+        stats.record("parse_raw_data", {name: b - a for name, a, b in zip(phases, marks, marks[1:])},
+                     literals=literals, kanji=len(kanji_metrics_dict), imputed=len(kanji) - measured,
+                     edges=len(composed))
     return kanji_metrics_dict
 
+def impute_metrics(extra: list, measured_components: dict, columns: dict, index: dict):
+    """
+    Metrics for the literals missing from the csv (extra: their component
+    lists in node order), one list per kanji_class field. Strokes are the
+    summed strokes of the components that have measured strokes, plus the
+    median gap of that estimate over the measured kanji (measured_components:
+    their component lists); the median stroke count when no component is
+    measured. Grade is the highest grade, jlpt 0 (not on the test) and both
+    frequencies 0, which scores the frequency term as rarest
+    """
+    measured = len(columns["id"])
+    strokes = columns["strokes"]
+    def estimate(literal, components):
+        known = [strokes[index[c]] for c in components if c != literal and index.get(c, measured) < measured]
+        return sum(known) if known else None
+
+    gaps = []
+    for literal, components in measured_components.items():
+        guess = estimate(literal, components)
+        if guess is not None:
+            gaps.append(strokes[index[literal]] - guess)
+    gap = float(np.median(gaps)) if gaps else 0.0
+    typical = int(np.median(strokes)) if strokes else 1
+
+    imputed = {name: [] for name in ("id", "strokes", "grade", "jlpt", "rfreq", "kfreq")}
+    first_id = max(columns["id"], default=0) + 1
+    for i, components in enumerate(extra):
+        guess = estimate(None, components)
+        imputed["id"].append(first_id + i)
+        imputed["strokes"].append(typical if guess is None else int(min(max(round(guess + gap), 1), MAX_STROKES)))
+        imputed["grade"].append(int(MAX_GRADE))
+        imputed["jlpt"].append(0)
+        imputed["rfreq"].append(0)
+        imputed["kfreq"].append(0)
+    imputed["difficulty"] = difficulty_scores(imputed["strokes"], imputed["grade"], imputed["jlpt"],
+                                              imputed["rfreq"], GRAPH_WEIGHTS).tolist()
+    return imputed
+
 
 if __name__ == '__main__':
     #first get the radicals and kanji from krad, reorder for correct direction in graph
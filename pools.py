@@ -0,0 +1,18 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pools for the parallel entry points (find_learning_paths,
+# compare_order_matrix, tune_weights, the query service). Workers are forked
+# where the platform allows it, so they start with the parent's graph and
+# indexes instead of pickling or rebuilding them.
+
+def pool_context(start_method: str = None):
+    """multiprocessing context for start_method, "fork" where available when None"""
+    if start_method is None and "fork" in multiprocessing.get_all_start_methods():
+        start_method = "fork"
+    return multiprocessing.get_context(start_method)
+
+def process_pool(workers: int, initializer=None, initargs: tuple = (), start_method: str = None) -> ProcessPoolExecutor:
+    """ProcessPoolExecutor of `workers` processes started with pool_context(start_method)"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=pool_context(start_method),
+                               initializer=initializer, initargs=initargs)
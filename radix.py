@@ -0,0 +1,80 @@
+import time
+import weakref
+import numpy as np
+from compiled import compiled_graph
+
+#edge weights of each compiled graph as a list of python ints, see integer_weights
+_weights = weakref.WeakKeyDictionary()
+
+def integer_weights(graph: compiled_graph) -> list:
+    """graph.weights as python ints, converted once per graph"""
+    weights = _weights.get(graph)
+    if weights is None:
+        weights = _weights[graph] = np.asarray(graph.weights).astype(np.int64).tolist()
+    return weights
+
+def dijkstras_radix(source_kanji: str, graph: compiled_graph, target_kanji: str = None, stats=None):
+    """
+    dijkstras_compiled with a radix heap instead of a binary heap. Edge weights
+    are fourth powers of stroke deltas, so they are exact integers and the
+    distances come back as ints (inf for unreached vertices).
+    The radix heap is inlined: bucket i holds the keys whose highest bit
+    differing from the last popped key is bit i-1, so a pop only compares keys
+    when it refills bucket 0, and each key moves to a lower bucket at most once
+    per bit. Keys are never below the last popped one, which Dijkstra guarantees
+    """
+    source = graph.index.get(source_kanji)
+    if source is None:
+        print(f"Error : {source_kanji} not found in kanji dictionary")
+        return None, None
+    target = graph.index.get(target_kanji, -1)
+    start = time.perf_counter() if stats else 0
+
+    offsets = memoryview(graph.offsets)
+    neighbors = memoryview(graph.neighbors)
+    weights = integer_weights(graph)
+
+    distances = [float('inf')] * graph.num_nodes
+    predecessors = [-1] * graph.num_nodes
+    distances[source] = 0
+    #push/pop inlined, method calls cost more than the queue work itself
+    buckets = [[] for _ in range(65)]
+    buckets[0].append((0, source))
+    last = 0
+    size = 1
+    settled = relaxed = decreases = 0
+    while size:
+        if not buckets[0]:
+            i = 1
+            while not buckets[i]:
+                i += 1
+            bucket = buckets[i]
+            buckets[i] = []
+            last = min(bucket)[0]
+            for entry in bucket:
+                buckets[(entry[0] ^ last).bit_length()].append(entry)
+        current_dist, u = buckets[0].pop()
+        size -= 1
+        if current_dist > distances[u]:
+            continue
+        settled += 1
+        if u == target:
+            break
+        lo, hi = offsets[u], offsets[u + 1]
+        relaxed += hi - lo
+        for i in range(lo, hi):
+            v = neighbors[i]
+            new_dist = current_dist + weights[i]
+            if new_dist < distances[v]:
+                distances[v] = new_dist
+                predecessors[v] = u
+                buckets[(new_dist ^ last).bit_length()].append((new_dist, v))
+                size += 1
+                decreases += 1
+
+    if stats:
+        pops = decreases + 1 - size
+        stats.record("dijkstras", {"search": time.perf_counter() - start},
+                     settled=settled, edges_relaxed=relaxed, decreases=decreases,
+                     pushes=decreases + 1, pops=pops, stale_pops=pops - settled)
+    return distances, predecessors
@@ -0,0 +1,137 @@
+import weakref
+import numpy as np
+from compiled import compiled_graph
+
+# Reachability pre-check for path queries. The graph is condensed into its
+# strongly connected components (Tarjan), which form a DAG; every component
+# gets a bitset of the components it can reach, so "can u reach v" is one bit
+# lookup and unreachable pairs are rejected without running a search.
+# Tarjan numbers components in reverse topological order (a component is
+# finished after everything it reaches), so DAG edges always go from a higher
+# to a lower component id.
+
+#above this many components the bitsets (components^2 / 8 bytes) are not built
+#and only the topological order test is used, which can't prove every
+#unreachable pair but never rejects a reachable one
+MAX_BITSET_COMPONENTS = 20_000
+
+class reachability_index:
+    """
+    component[u]: SCC of node id u. reach: (components, ceil(components / 8))
+    packed bit matrix, bit d of row c set if component c reaches component d,
+    or None for graphs with more than MAX_BITSET_COMPONENTS components
+    """
+    def __init__(self, component, num_components, reach=None):
+        self.component = component
+        self.num_components = num_components
+        self.reach = reach
+        self._component = component.tolist()
+
+    def reachable(self, u: int, v: int) -> bool:
+        """False only if there is no path from node id u to node id v"""
+        cu, cv = self._component[u], self._component[v]
+        if cu == cv:
+            return True
+        if cv > cu:
+            return False
+        if self.reach is None:
+            return True
+        return bool(self.reach[cu, cv >> 3] >> (cv & 7) & 1)
+
+    def nbytes(self):
+        return self.component.nbytes + (0 if self.reach is None else self.reach.nbytes)
+
+
+def strongly_connected_components(graph: compiled_graph):
+    """Component of every node id (numbered in reverse topological order) and the component count"""
+    n = graph.num_nodes
+    offsets = graph.offsets.tolist()
+    neighbors = graph.neighbors.tolist()
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    component = [-1] * n
+    stack = []
+    counter = 0
+    count = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        #iterative dfs, each frame is (node, next edge to look at)
+        work = [(root, offsets[root])]
+        while work:
+            u, i = work[-1]
+            if i < offsets[u + 1]:
+                work[-1] = (u, i + 1)
+                v = neighbors[i]
+                if index[v] == -1:
+                    index[v] = low[v] = counter
+                    counter += 1
+                    stack.append(v)
+                    on_stack[v] = True
+                    work.append((v, offsets[v]))
+                elif on_stack[v] and index[v] < low[u]:
+                    low[u] = index[v]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if low[u] < low[parent]:
+                    low[parent] = low[u]
+            if low[u] == index[u]:
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    component[w] = count
+                    if w == u:
+                        break
+                count += 1
+    return np.array(component, dtype=np.int32), count
+
+def condensation(graph: compiled_graph, component: np.ndarray, num_components: int):
+    """CSR (offsets, targets) of the component DAG, without duplicate edges"""
+    src = component[np.repeat(np.arange(graph.num_nodes), np.diff(graph.offsets))].astype(np.int64)
+    dst = component[graph.neighbors].astype(np.int64)
+    keys = np.unique((src * num_components + dst)[src != dst])
+    offsets = np.zeros(num_components + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_components, minlength=num_components), out=offsets[1:])
+    return offsets, (keys % num_components).astype(np.int32)
+
+def build_reachability_index(graph: compiled_graph) -> reachability_index:
+    component, count = strongly_connected_components(graph)
+    if count > MAX_BITSET_COMPONENTS:
+        return reachability_index(component, count)
+    offsets, targets = condensation(graph, component, count)
+    reach = np.zeros((count, (count + 7) // 8), dtype=np.uint8)
+    ids = np.arange(count)
+    reach[ids, ids >> 3] = 1 << (ids & 7)
+    #successors have lower ids, so their rows are complete when row c is built
+    for c in range(count):
+        lo, hi = offsets[c], offsets[c + 1]
+        if lo < hi:
+            reach[c] |= np.bitwise_or.reduce(reach[targets[lo:hi]], axis=0)
+    return reachability_index(component, count, reach)
+
+#one index per live graph, dropped together with the graph
+_indexes = weakref.WeakKeyDictionary()
+
+def get_reachability_index(graph: compiled_graph) -> reachability_index:
+    if graph not in _indexes:
+        _indexes[graph] = build_reachability_index(graph)
+    return _indexes[graph]
+
+
+if __name__ == '__main__':
+    import time
+    from snapshot import load_graph
+    graph = load_graph()
+    start = time.perf_counter()
+    index = get_reachability_index(graph)
+    print(f"{index.num_components} strongly connected components in {graph.num_nodes} nodes, "
+          f"built in {(time.perf_counter() - start) * 1000:.1f} ms, {index.nbytes()} bytes")
+    sizes = np.bincount(index.component)
+    print(f"largest component: {sizes.max()} nodes, singletons: {int((sizes == 1).sum())}")
@@ -0,0 +1,47 @@
+import numpy as np
+
+# Columnar scoring shared by parsing.py and count.py. Every function takes
+# whole columns (anything np.asarray accepts) and returns a float64 array.
+
+#(strokes, grade, jlpt, frequency) weights used by parse_raw_data
+GRAPH_WEIGHTS = (0.1, 0.1, 0.2, 0.5)
+#weights used by count.load_kanji_difficulty for the ordering comparisons
+ORDER_WEIGHTS = (0.2, 0.2, 0.3, 0.2)
+
+MAX_STROKES = 29.0
+MAX_GRADE = 7.0
+
+def difficulty_scores(strokes, grade, jlpt, freq, weights=GRAPH_WEIGHTS, jlpt_scale: float = 6.0):
+    """
+    Weighted difficulty of every row:
+    w0*strokes/29 + w1*grade/7 + w2*(6-jlpt)/jlpt_scale + w3*1/(freq+1)
+    (the frequency term is 1.0 for freq <= 0)
+    """
+    features = difficulty_features(strokes, grade, jlpt, freq, jlpt_scale)
+    return (
+        weights[0] * features[:, 0] +
+        weights[1] * features[:, 1] +
+        weights[2] * features[:, 2] +
+        weights[3] * features[:, 3]
+    ).reshape(np.shape(strokes))
+
+def difficulty_features(strokes, grade, jlpt, freq, jlpt_scale: float = 6.0):
+    """
+    The four unweighted terms of difficulty_scores as an (n, 4) matrix, so
+    many weight vectors can be scored at once with a matrix product
+    """
+    strokes = np.asarray(strokes, dtype=np.float64)
+    grade = np.asarray(grade, dtype=np.float64)
+    jlpt = np.asarray(jlpt, dtype=np.float64)
+    freq = np.asarray(freq, dtype=np.float64)
+    return np.column_stack([
+        strokes / MAX_STROKES,
+        grade / MAX_GRADE,
+        (6 - jlpt) / jlpt_scale,
+        np.where(freq > 0, 1.0 / (np.maximum(freq, 0) + 1), 1.0),
+    ])
+
+def edge_weights(strokes_v, strokes_u):
+    """Fourth power of the stroke count difference of every edge"""
+    delta = np.asarray(strokes_v, dtype=np.float64) - np.asarray(strokes_u, dtype=np.float64)
+    return delta ** 4
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import signal
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import greedy
+from compiled import compiled_graph
+from greedy import find_learning_path, _init_path_worker
+from snapshot import load_graph
+
+# Resident query service. The graph (and the search indexes) are loaded once,
+# then JSON queries are answered over localhost HTTP or a Unix socket:
+#
+#   GET /path?source=一&target=謝[&engine=ch]  -> {"path": [...], "weight": ...}
+#   GET /distance?source=一&target=謝           -> {"weight": ...}
+#   GET /neighbors?kanji=森[&limit=10]          -> {"neighbors": [{"kanji", "weight"}, ...]}
+#   GET /stats                                  -> per endpoint latency stats
+#
+# Connections are served concurrently by asyncio, searches run in a process
+# pool forked after the indexes are built, so every worker starts warm.
+#
+#   python service.py --port 8765
+#   python service.py --unix /tmp/kanji.sock --workers 4
+
+ENGINES = ("dijkstra", "alt", "ch", "cache")
+
+def _search(source_kanji: str, target_kanji: str, engine: str, graph: compiled_graph = None):
+    """(path, weight) like find_learning_path, without its console output"""
+    #pool workers get the graph from greedy's worker initializer
+    graph = graph if graph is not None else greedy._worker_graph
+    with contextlib.redirect_stdout(io.StringIO()):
+        return find_learning_path(source_kanji, target_kanji, graph, engine=engine)
+
+class latency_stats:
+    """Request count, errors and latency percentiles (ms) of one endpoint, over the last `window` requests"""
+    def __init__(self, window: int = 10000):
+        self.count = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.errors += error
+        self.latencies.append(seconds * 1000)
+
+    def summary(self):
+        if not self.latencies:
+            return {"count": self.count, "errors": self.errors}
+        times = np.array(self.latencies)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": float(times.mean()),
+            "p50_ms": float(np.percentile(times, 50)),
+            "p90_ms": float(np.percentile(times, 90)),
+            "p99_ms": float(np.percentile(times, 99)),
+            "max_ms": float(times.max()),
+        }
+
+class query_error(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class path_service:
+    """
+    Query handlers over one warm graph. workers: search processes, 0 runs
+    searches on the event loop itself (no pool, one search at a time)
+    """
+    def __init__(self, graph: compiled_graph, engine: str = "ch", workers: int = None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown search engine: {engine}")
+        self.graph = graph
+        self.engine = engine
+        self.workers = os.cpu_count() if workers is None else workers
+        self.pool = None
+        self.stats = {}
+        self.started = time.time()
+        self.handlers = {
+            "/path": self.path,
+            "/distance": self.distance,
+            "/neighbors": self.neighbors,
+            "/stats": self.report,
+        }
+
+    def warm_up(self):
+        """Build (or load) the indexes before workers fork, so they inherit them"""
+        from reachability import get_reachability_index
+        get_reachability_index(self.graph)
+        if self.engine == "alt":
+            from alt import get_alt_index
+            get_alt_index(self.graph)
+        elif self.engine == "ch":
+            from ch import get_ch_index
+            get_ch_index(self.graph)
+
+    def start_pool(self):
+        if self.workers > 0:
+            from pools import process_pool
+            self.pool = process_pool(self.workers, _init_path_worker, (self.graph,))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _kanji(self, params: dict, name: str):
+        if name not in params:
+            raise query_error(400, f"missing parameter: {name}")
+        kanji = params[name]
+        if kanji not in self.graph.index:
+            raise query_error(404, f"{kanji} not found in dictionary")
+        return kanji
+
+    async def _find(self, params: dict):
+        source, target = self._kanji(params, "source"), self._kanji(params, "target")
+        engine = params.get("engine", self.engine)
+        if engine not in ENGINES:
+            raise query_error(400, f"unknown search engine: {engine}")
+        if self.pool is None:
+            path, weight = _search(source, target, engine, self.graph)
+        else:
+            loop = asyncio.get_running_loop()
+            path, weight = await loop.run_in_executor(self.pool, _search, source, target, engine)
+        return source, target, path, weight
+
+    async def path(self, params: dict):
+        source, target, path, weight = await self._find(params)
+        return {"source": source, "target": target, "found": path is not None, "path": path, "weight": weight}
+
+    async def distance(self, params: dict):
+        source, target, path, weight = await self._find(params)
+        return {"source": source, "target": target, "found": path is not None, "weight": weight}
+
+    async def neighbors(self, params: dict):
+        kanji = self._kanji(params, "kanji")
+        nbrs, weights = self.graph.out_edges(self.graph.index[kanji])
+        limit = int(params.get("limit", len(nbrs)))
+        return {"kanji": kanji, "neighbors": [{"kanji": self.graph.kanji[v], "weight": float(w)}
+                                             for v, w in zip(nbrs[:limit].tolist(), weights[:limit].tolist())]}
+
+    async def report(self, params: dict):
+        return {
+            "uptime_s": time.time() - self.started,
+            "nodes": self.graph.num_nodes,
+            "edges": self.graph.num_edges,
+            "engine": self.engine,
+            "workers": self.workers,
+            "endpoints": {name: stats.summary() for name, stats in sorted(self.stats.items())},
+        }
+
+    async def handle(self, target: str):
+        """(status, JSON body) for one request target like "/path?source=一&target=謝" """
+        start = time.perf_counter()
+        url = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        handler = self.handlers.get(url.path)
+        try:
+            if handler is None:
+                raise query_error(404, f"unknown endpoint: {url.path}")
+            status, body = 200, await handler(params)
+        except query_error as e:
+            status, body = e.status, {"error": str(e)}
+        except ValueError as e:
+            status, body = 400, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": f"{type(e).__name__}: {e}"}
+        name = url.path if handler is not None else "unknown"
+        self.stats.setdefault(name, latency_stats()).add(time.perf_counter() - start, status != 200)
+        return status, body
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1: GET requests, keep-alive unless the client sends Connection: close"""
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   500: "Internal Server Error"}
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                #raw (not percent encoded) kanji in the target arrive as utf-8 bytes
+                parts = request_line.decode("utf-8", errors="surrogateescape").split()
+                if len(parts) != 3:
+                    break
+                method, target, version = parts
+                if method != "GET":
+                    status, body = 405, {"error": f"{method} not supported"}
+                else:
+                    status, body = await self.handle(target)
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8", errors="replace")
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                writer.write(f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(service: path_service, host: str = "127.0.0.1", port: int = 8765, unix: str = None,
+                ready=None):
+    """Serve until SIGINT / SIGTERM or cancelled. ready: optional callback with the listening server"""
+    if unix:
+        server = await asyncio.start_unix_server(service.serve_connection, path=unix)
+    else:
+        server = await asyncio.start_server(service.serve_connection, host, port)
+    if ready is not None:
+        ready(server)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError, RuntimeError):
+            loop.add_signal_handler(signum, stop.set)
+    async with server:
+        await stop.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resident kanji learning path service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--engine", default="ch", choices=ENGINES)
+    parser.add_argument("--workers", type=int, default=None, help="search processes, 0 = search in the event loop")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    service = path_service(load_graph(), args.engine, args.workers)
+    service.warm_up()
+    service.start_pool()
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"{service.graph.num_nodes} kanji loaded in {time.perf_counter() - start:.1f}s, "
+          f"{service.workers} workers, listening on {where}")
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    finally:
+        service.close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+import numpy as np
+from compiled import compiled_graph
+from snapshot import ARRAYS
+
+# Compiled graph arrays in one multiprocessing.shared_memory block. The owner
+# publishes a graph once, workers get the small picklable handle and attach:
+# their arrays are read only views on the shared block, so memory stays flat
+# as workers are added and a worker starts with an attach instead of a parse.
+#
+#   with publish_graph(graph) as shared:
+#       pool = ProcessPoolExecutor(initializer=init, initargs=(shared.handle,))
+#       ... worker: graph = attach_graph(handle)
+
+ALIGN = 64
+
+@dataclass(frozen=True)
+class shared_graph_handle:
+    """Where every array lives in the block: (array name, dtype, length, byte offset)"""
+    name: str
+    layout: tuple
+    kanji_offset: int
+    kanji_length: int
+
+class shared_graph:
+    """Owner of a published graph. close() detaches, unlink() frees the block"""
+    def __init__(self, shm: shared_memory.SharedMemory, handle: shared_graph_handle):
+        self.shm = shm
+        self.handle = handle
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+def publish_graph(graph: compiled_graph, name: str = None) -> shared_graph:
+    """Copy the arrays and kanji of graph into a new shared memory block"""
+    kanji = "\n".join(graph.kanji).encode("utf-8")
+    layout = []
+    size = 0
+    for array_name in ARRAYS:
+        array = np.asarray(getattr(graph, array_name))
+        size = -(-size // ALIGN) * ALIGN
+        layout.append((array_name, array.dtype.str, len(array), size))
+        size += array.nbytes
+    kanji_offset = size
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(kanji_offset + len(kanji), 1))
+    for array_name, dtype, length, offset in layout:
+        np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)[:] = getattr(graph, array_name)
+    shm.buf[kanji_offset:kanji_offset + len(kanji)] = kanji
+    return shared_graph(shm, shared_graph_handle(shm.name, tuple(layout), kanji_offset, len(kanji)))
+
+def _open(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    #before python 3.13 attaching also registers the block with this process'
+    #resource tracker, which unlinks it when the process exits
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+#blocks attached by this process, kept open as long as the process runs since
+#the graph arrays point into them
+_attached = {}
+
+def attach_graph(handle: shared_graph_handle) -> compiled_graph:
+    """Zero copy compiled_graph over a published block (only the kanji list is rebuilt)"""
+    shm = _attached.get(handle.name)
+    if shm is None:
+        shm = _attached[handle.name] = _open(handle.name)
+    arrays = []
+    for _, dtype, length, offset in handle.layout:
+        array = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        arrays.append(array)
+    kanji = bytes(shm.buf[handle.kanji_offset:handle.kanji_offset + handle.kanji_length]).decode("utf-8")
+    return compiled_graph(kanji.split("\n") if kanji else [], *arrays)
+
+
+if __name__ == '__main__':
+    import time
+    from snapshot import load_graph
+    graph = load_graph()
+    with publish_graph(graph) as shared:
+        start = time.perf_counter()
+        attached = attach_graph(shared.handle)
+        print(f"published {shared.shm.size} bytes as {shared.handle.name}, "
+              f"attached in {(time.perf_counter() - start) * 1000:.2f} ms "
+              f"({attached.num_nodes} kanji, {attached.num_edges} edges)")
+        del attached
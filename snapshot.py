@@ -0,0 +1,158 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from compiled import compiled_graph, compile_graph
+
+# On disk snapshot of the compiled graph: one .npy file per array (so every
+# array can be memory mapped), the kanji as a utf-8 text file and a small
+# meta.json with the size/mtime/hash of the files the graph was built from.
+# A warm start only reads these files, no krad.json or pandas involved.
+# Several processes may start cold at once: every writer fills its own
+# temporary directory and swaps it in, a reader that loses its files to a
+# swap falls back to parsing.
+
+SNAPSHOT_DIR = "graph_snapshot"
+SNAPSHOT_VERSION = 3
+#parsing.py builds the graph and scoring.py holds the difficulty and edge
+#weight formulas (and GRAPH_WEIGHTS), so editing either rebuilds the snapshot
+SOURCE_FILES = ["krad.json", "kanjimetrics.csv", "parsing.py", "scoring.py"]
+ARRAYS = ["ids", "strokes", "grade", "jlpt", "rfreq", "kfreq", "difficulty",
+          "offsets", "neighbors", "weights", "imputed"]
+
+def _file_hash(path: str):
+    h = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _source_info(sources, hashes: bool = True):
+    info = {}
+    for path in sources:
+        stat = os.stat(path)
+        info[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                      "sha1": _file_hash(path) if hashes else None}
+    return info
+
+def _swap_in(tmp: str, path: str):
+    """
+    Move the finished snapshot directory tmp to path. An older snapshot at
+    path is moved aside and deleted. If another writer's snapshot lands in
+    between, tmp is dropped instead (both were built from the same sources)
+    """
+    try:
+        os.replace(tmp, path)
+        return
+    except OSError:
+        pass
+    old = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".old",
+                           dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        os.replace(path, old)
+    except FileNotFoundError:
+        pass
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    shutil.rmtree(old, ignore_errors=True)
+
+def save_snapshot(graph: compiled_graph, path: str = SNAPSHOT_DIR, sources=SOURCE_FILES):
+    """Write the graph to path, replacing any older snapshot"""
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                           dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(getattr(graph, name)))
+        with open(os.path.join(tmp, "kanji.txt"), "w", encoding="utf-8") as file:
+            file.write("\n".join(graph.kanji))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump({"version": SNAPSHOT_VERSION, "sources": _source_info(sources)}, file, indent=1)
+        _swap_in(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def snapshot_is_fresh(path: str = SNAPSHOT_DIR):
+    """
+    True if the snapshot matches the current source files. Size and mtime are
+    checked first, a file whose mtime changed is only hashed to confirm
+    """
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+    try:
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        sources = meta["sources"].items()
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        #swapped out or damaged: rebuild
+        return False
+    if meta.get("version") != SNAPSHOT_VERSION:
+        return False
+
+    touched = False
+    for source, saved in sources:
+        if not os.path.exists(source):
+            return False
+        stat = os.stat(source)
+        if stat.st_size != saved["size"]:
+            return False
+        if stat.st_mtime_ns != saved["mtime_ns"]:
+            if _file_hash(source) != saved["sha1"]:
+                return False
+            #same content, just touched: remember the new mtime to skip hashing next time
+            saved["mtime_ns"] = stat.st_mtime_ns
+            touched = True
+    if touched:
+        #other processes may be reading meta.json, so replace it whole
+        fd, tmp = tempfile.mkstemp(prefix="meta.", suffix=".tmp", dir=path)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(meta, file, indent=1)
+            os.replace(tmp, meta_path)
+        except OSError:
+            #the snapshot was swapped out meanwhile, the mtimes are just not remembered
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+    return True
+
+def load_snapshot(path: str = SNAPSHOT_DIR, mmap: bool = True) -> compiled_graph:
+    """Load a saved snapshot, arrays are memory mapped read only unless mmap is False"""
+    arrays = [np.load(os.path.join(path, name + ".npy"), mmap_mode="r" if mmap else None)
+              for name in ARRAYS]
+    with open(os.path.join(path, "kanji.txt"), "r", encoding="utf-8") as file:
+        kanji = file.read().split("\n")
+    return compiled_graph(kanji, *arrays)
+
+def load_graph(path: str = SNAPSHOT_DIR, mmap: bool = True, reachability: bool = True) -> compiled_graph:
+    """
+    Compiled graph for the entry points: the snapshot when it is fresh,
+    otherwise parse the raw data, compile it and refresh the snapshot.
+    reachability: also build the reachability index (a few tens of ms), so the
+    first query doesn't pay for it
+    """
+    graph = None
+    if snapshot_is_fresh(path):
+        try:
+            graph = load_snapshot(path, mmap)
+        except (OSError, ValueError):
+            #swapped out by a concurrent writer (or damaged), parse instead
+            pass
+    if graph is None:
+        from parsing import parse_raw_data
+        graph = compile_graph(parse_raw_data())
+        save_snapshot(graph, path)
+    if reachability:
+        from reachability import get_reachability_index
+        get_reachability_index(graph)
+    return graph
+
+if __name__ == '__main__':
+    import time
+    start = time.perf_counter()
+    graph = load_graph()
+    print(f"loaded {graph.num_nodes} kanji, {graph.num_edges} edges in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,164 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass
+import numpy as np
+from compiled import compiled_graph
+from scoring import edge_weights
+
+# Synthetic composition graphs for scaling tests. A model is fitted to the
+# real compiled graph: every synthetic vertex copies the metrics and the out
+# degree of a random real kanji, and every edge draws its stroke delta from
+# the real edges leaving kanji with the same stroke count, then lands on a
+# random vertex with that many strokes. Edges are directed (the real graph
+# has both directions of each composition) and presorted by weight.
+
+@dataclass
+class graph_model:
+    ids: np.ndarray
+    strokes: np.ndarray
+    grade: np.ndarray
+    jlpt: np.ndarray
+    rfreq: np.ndarray
+    kfreq: np.ndarray
+    difficulty: np.ndarray
+    imputed: np.ndarray
+    degree: np.ndarray
+    #real edge stroke deltas grouped by the stroke count of the edge source
+    delta_start: np.ndarray
+    delta_count: np.ndarray
+    deltas: np.ndarray
+
+def fit_model(graph: compiled_graph) -> graph_model:
+    strokes = graph.strokes.astype(np.int64)
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.offsets))
+    src_strokes = strokes[src]
+    deltas = strokes[graph.neighbors] - src_strokes
+    order = np.argsort(src_strokes, kind="stable")
+    top = int(strokes.max()) + 1
+    delta_count = np.bincount(src_strokes, minlength=top)
+    delta_start = np.concatenate([[0], np.cumsum(delta_count)[:-1]])
+    return graph_model(
+        ids=np.asarray(graph.ids), strokes=strokes, grade=np.asarray(graph.grade),
+        jlpt=np.asarray(graph.jlpt), rfreq=np.asarray(graph.rfreq), kfreq=np.asarray(graph.kfreq),
+        difficulty=np.asarray(graph.difficulty), imputed=np.asarray(graph.imputed), degree=np.diff(graph.offsets),
+        delta_start=delta_start, delta_count=delta_count, deltas=deltas[order]
+    )
+
+def _nodes(model: graph_model, num_nodes: int, rng):
+    """Real row each synthetic vertex copies, and the vertices grouped by stroke count"""
+    rows = rng.integers(0, len(model.strokes), num_nodes)
+    strokes = model.strokes[rows]
+    by_stroke = np.argsort(strokes, kind="stable")
+    top = max(int(strokes.max()) + 1, len(model.delta_count))
+    stroke_count = np.bincount(strokes, minlength=top)
+    stroke_start = np.concatenate([[0], np.cumsum(stroke_count)[:-1]])
+    return rows, strokes, by_stroke, stroke_start, stroke_count
+
+def _edge_chunks(model: graph_model, rows, strokes, by_stroke, stroke_start, stroke_count,
+                 rng, chunk_size: int):
+    """(first vertex, neighbors, weights, per vertex degree) for consecutive vertex chunks"""
+    num_nodes = len(rows)
+    for lo in range(0, num_nodes, chunk_size):
+        hi = min(lo + chunk_size, num_nodes)
+        degree = model.degree[rows[lo:hi]]
+        src = np.repeat(np.arange(lo, hi), degree)
+        src_strokes = strokes[src]
+        pick = (rng.random(len(src)) * model.delta_count[src_strokes]).astype(np.int64)
+        target_strokes = src_strokes + model.deltas[model.delta_start[src_strokes] + pick]
+        valid = (target_strokes >= 0) & (target_strokes < len(stroke_count))
+        target_strokes = np.where(valid, target_strokes, 0)
+        group = np.where(valid, stroke_count[target_strokes], 0)
+        slot = (rng.random(len(src)) * group).astype(np.int64)
+        #no vertex with that stroke count: any random vertex instead
+        fallback = rng.integers(0, num_nodes, len(src))
+        neighbors = np.where(group > 0, by_stroke[np.minimum(stroke_start[target_strokes] + slot, num_nodes - 1)],
+                             fallback)
+        weights = edge_weights(strokes[src], strokes[neighbors])
+        #presorting by weight inside each vertex, like parse_raw_data
+        order = np.lexsort((weights, src))
+        yield lo, neighbors[order].astype(np.int32), weights[order], degree
+
+def generate_graph(num_nodes: int, model: graph_model, seed: int = 0, chunk_size: int = 65536) -> compiled_graph:
+    """In memory synthetic compiled_graph with num_nodes vertices"""
+    rng = np.random.default_rng(seed)
+    rows, strokes, by_stroke, stroke_start, stroke_count = _nodes(model, num_nodes, rng)
+    neighbors, weights, degrees = [], [], []
+    for _, nbrs, wts, degree in _edge_chunks(model, rows, strokes, by_stroke, stroke_start, stroke_count,
+                                             rng, chunk_size):
+        neighbors.append(nbrs)
+        weights.append(wts)
+        degrees.append(degree)
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.concatenate(degrees), out=offsets[1:])
+    return compiled_graph(
+        [f"s{i}" for i in range(num_nodes)],
+        np.arange(num_nodes, dtype=np.int64), model.strokes[rows].astype(np.int32),
+        model.grade[rows], model.jlpt[rows], model.rfreq[rows], model.kfreq[rows], model.difficulty[rows],
+        offsets, np.concatenate(neighbors), np.concatenate(weights), model.imputed[rows]
+    )
+
+def write_graph(path: str, num_nodes: int, model: graph_model, seed: int = 0, chunk_size: int = 65536):
+    """
+    Stream a synthetic graph to disk in the snapshot.py layout (load it with
+    snapshot.load_snapshot). Vertex degrees are drawn up front so the edge
+    arrays can be preallocated as .npy memmaps, then edges are generated and
+    flushed one vertex chunk at a time, so memory stays at one chunk of edges
+    """
+    rng = np.random.default_rng(seed)
+    rows, strokes, by_stroke, stroke_start, stroke_count = _nodes(model, num_nodes, rng)
+    degree = model.degree[rows]
+    num_edges = int(degree.sum())
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    save = lambda name, array: np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+    save("ids", np.arange(num_nodes, dtype=np.int64))
+    save("strokes", model.strokes[rows].astype(np.int32))
+    for name in ("grade", "jlpt", "rfreq", "kfreq", "difficulty", "imputed"):
+        save(name, getattr(model, name)[rows])
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(degree, out=offsets[1:])
+    save("offsets", offsets)
+
+    open_memmap = np.lib.format.open_memmap
+    neighbors = open_memmap(os.path.join(path, "neighbors.npy"), mode="w+", dtype=np.int32, shape=(num_edges,))
+    weights = open_memmap(os.path.join(path, "weights.npy"), mode="w+", dtype=np.float64, shape=(num_edges,))
+    for lo, nbrs, wts, _ in _edge_chunks(model, rows, strokes, by_stroke, stroke_start, stroke_count,
+                                         rng, chunk_size):
+        neighbors[offsets[lo]:offsets[lo] + len(nbrs)] = nbrs
+        weights[offsets[lo]:offsets[lo] + len(wts)] = wts
+        neighbors.flush()
+        weights.flush()
+    del neighbors, weights
+
+    with open(os.path.join(path, "kanji.txt"), "w", encoding="utf-8") as file:
+        for lo in range(0, num_nodes, chunk_size):
+            file.write("\n".join(f"s{i}" for i in range(lo, min(lo + chunk_size, num_nodes))))
+            if lo + chunk_size < num_nodes:
+                file.write("\n")
+    from snapshot import SNAPSHOT_VERSION
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump({"version": SNAPSHOT_VERSION, "sources": {},
+                   "synthetic": {"num_nodes": num_nodes, "num_edges": num_edges, "seed": seed}}, file, indent=1)
+
+def to_kanji_dict(graph: compiled_graph) -> dict:
+    """The parse_raw_data structure ({kanji: kanji_class}) of a compiled graph"""
+    return {k: graph.node(u) for u, k in enumerate(graph.kanji)}
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from snapshot import load_graph, load_snapshot
+    parser = argparse.ArgumentParser(description="Write a synthetic kanji composition graph")
+    parser.add_argument("num_nodes", type=int)
+    parser.add_argument("--out", default="synthetic_graph")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_graph(args.out, args.num_nodes, fit_model(load_graph()), args.seed)
+    graph = load_snapshot(args.out)
+    print(f"wrote {graph.num_nodes} vertices, {graph.num_edges} edges to {args.out} "
+          f"in {time.perf_counter() - start:.1f}s ({graph.nbytes() / 1e6:.1f} MB of arrays)")
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+import numpy as np
+from compiled import compiled_graph, compiled_for
+from greedy import dijkstras_compiled, reconstruct_path_ids
+
+class path_tree_cache:
+    """
+    LRU cache of shortest path trees keyed by source kanji. A tree is the
+    distances (float64) and predecessor ids (int32, -1 = none) of one full
+    search, so any later query from the same source is a single path walk.
+    Evicts least recently used trees past max_trees or max_bytes, and drops
+    everything when it is used with a different graph object than before.
+    """
+    def __init__(self, max_trees: int = 128, max_bytes: int = None):
+        self.max_trees = max_trees
+        self.max_bytes = max_bytes
+        self.trees = OrderedDict()
+        self.graph = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def invalidate(self):
+        """Forget every tree, e.g. after the graph was rebuilt"""
+        self.trees.clear()
+        self.nbytes = 0
+
+    def on_update(self, event):
+        """
+        graph_updater listener (see updates.py): drop only the trees that reach a
+        node whose out edges changed, any other tree is still exact. Kept trees
+        are padded for nodes the update added (unreachable from them)
+        """
+        if event.graph is not self.graph:
+            return
+        changed = np.array([self.graph.index[k] for k in event.adjacency], dtype=np.int64)
+        n = self.graph.num_nodes
+        for source, (distances, predecessors) in list(self.trees.items()):
+            old = changed[changed < len(distances)]
+            if np.isfinite(distances[old]).any():
+                del self.trees[source]
+                self.nbytes -= distances.nbytes + predecessors.nbytes
+                self.evictions += 1
+            elif len(distances) < n:
+                grown = (np.full(n, np.inf), np.full(n, -1, dtype=np.int32))
+                grown[0][:len(distances)] = distances
+                grown[1][:len(predecessors)] = predecessors
+                self.trees[source] = grown
+                self.nbytes += grown[0].nbytes + grown[1].nbytes - distances.nbytes - predecessors.nbytes
+
+    def tree(self, source_kanji: str, graph: compiled_graph):
+        """(distances, predecessors) arrays of source, None if source is unknown"""
+        if graph is not self.graph:
+            self.invalidate()
+            self.graph = graph
+        if source_kanji in self.trees:
+            self.hits += 1
+            self.trees.move_to_end(source_kanji)
+            return self.trees[source_kanji]
+
+        self.misses += 1
+        distances, predecessors = dijkstras_compiled(source_kanji, graph)
+        if distances is None:
+            return None
+        tree = (np.array(distances, dtype=np.float64), np.array(predecessors, dtype=np.int32))
+        self.trees[source_kanji] = tree
+        self.nbytes += tree[0].nbytes + tree[1].nbytes
+        self._evict()
+        return tree
+
+    def _evict(self):
+        while self.trees and (len(self.trees) > self.max_trees or
+                              (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            _, (distances, predecessors) = self.trees.popitem(last=False)
+            self.nbytes -= distances.nbytes + predecessors.nbytes
+            self.evictions += 1
+
+    def find_learning_path(self, source_kanji: str, target_kanji: str, kanji_dict):
+        """Same result as greedy.find_learning_path, served from the cached tree of source"""
+        graph = compiled_for(kanji_dict)
+        if target_kanji not in graph.index:
+            print(f"Error: {target_kanji} not found in dictionary")
+            return None, None
+        tree = self.tree(source_kanji, graph)
+        if tree is None:
+            return None, None
+
+        distances, predecessors = tree
+        target = graph.index[target_kanji]
+        if distances[target] == float('inf'):
+            print(f"No path exists from {source_kanji} to {target_kanji}")
+            return None, None
+        path = [graph.kanji[i] for i in reconstruct_path_ids(target, memoryview(predecessors))]
+        return path, float(distances[target])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "trees": len(self.trees),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+#shared cache behind find_learning_path(..., engine="cache")
+default_tree_cache = path_tree_cache()
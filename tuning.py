@@ -0,0 +1,158 @@
+import multiprocessing
+import time
+from typing import Dict, List
+import numpy as np
+from count import batch_inversions, load_external_order
+from parsing import read_metrics
+from pools import process_pool
+from scoring import difficulty_features, GRAPH_WEIGHTS, ORDER_WEIGHTS
+
+# Search for difficulty weights (strokes, grade, jlpt, frequency) whose
+# ranking has the fewest inversions against the textbook orders.
+# Candidates are scored as one (candidates × 4) @ (4 × kanji) product and
+# every candidate row gets its inversions from count.batch_inversions.
+# Each scorer is fitted on its own features, so the result can be dropped into
+# its weights (GRAPH_WEIGHTS or ORDER_WEIGHTS) as is.
+
+ORDER_FILES = {
+    "RTK": "RTKKanjiOrder.csv",
+    "Genki": "GenkiKanjiOrder.csv",
+    "Kodansha": "KodanshaKanjiOrder.csv",
+}
+
+#the scorers that can be tuned: the frequency column and jlpt scale they
+#score with and their current weights
+SCORERS = {
+    #parse_raw_data / parsing.calculate_difficulty
+    "parsing": {"freq_column": "Radical Freq.", "jlpt_scale": 6.0, "weights": GRAPH_WEIGHTS},
+    #count.load_kanji_difficulty, the ranking compare_orders checks
+    "count": {"freq_column": "Kanji Frequency without Proper Nouns", "jlpt_scale": 5.0, "weights": ORDER_WEIGHTS},
+}
+
+def load_features(metrics_path: str = "kanjimetrics.csv", scorer: str = "count"):
+    """Kanji in csv order and their (n, 4) difficulty feature matrix as `scorer` computes it"""
+    if scorer not in SCORERS:
+        raise ValueError(f"unknown scorer: {scorer}")
+    freq_column, jlpt_scale = SCORERS[scorer]["freq_column"], SCORERS[scorer]["jlpt_scale"]
+    kanji, strokes, grade, jlpt, freq = [], [], [], [], []
+    for chunk in read_metrics(metrics_path):
+        kanji += chunk["Kanji"]
+        strokes += chunk["Strokes"]
+        grade += chunk["Grade"]
+        jlpt += chunk["JLPT-test"]
+        freq += chunk[freq_column]
+    return kanji, difficulty_features(strokes, grade, jlpt, freq, jlpt_scale)
+
+def order_indices(order: List[str], kanji: List[str]) -> np.ndarray:
+    """Feature rows of the order's kanji, in the order's sequence"""
+    index = {k: i for i, k in enumerate(kanji)}
+    return np.array([index[k] for k in order if k in index], dtype=np.int64)
+
+def inversion_rates(weights: np.ndarray, features: np.ndarray, orders: List[np.ndarray]) -> np.ndarray:
+    """
+    (candidates, orders) inversion rate of every weight vector against every
+    order. Ties in difficulty are broken by csv position like compare_orders
+    """
+    scores = np.atleast_2d(weights) @ features.T
+    rates = np.zeros((scores.shape[0], len(orders)))
+    for j, idx in enumerate(orders):
+        n = len(idx)
+        if n < 2:
+            continue
+        sub = scores[:, idx]
+        by_difficulty = np.lexsort((np.broadcast_to(idx, sub.shape), sub), axis=-1)
+        ranks = np.empty_like(by_difficulty)
+        np.put_along_axis(ranks, by_difficulty, np.broadcast_to(np.arange(n), sub.shape), axis=1)
+        rates[:, j] = batch_inversions(ranks) / (n * (n - 1) / 2)
+    return rates
+
+def candidate_weights(count: int, seed: int = 0, center=None, concentration: float = 200.0) -> np.ndarray:
+    """
+    Weight vectors on the simplex (only relative weights change a ranking).
+    Uniform over the simplex, or concentrated around center when given
+    """
+    rng = np.random.default_rng(seed)
+    if center is None:
+        return rng.dirichlet(np.ones(4), size=count)
+    alpha = np.maximum(np.asarray(center, dtype=np.float64) * concentration, 1e-3)
+    return rng.dirichlet(alpha, size=count)
+
+#state of a tune_weights worker process, set once by _init_tuning_worker
+_worker_features = None
+_worker_orders = None
+
+def _init_tuning_worker(features, orders):
+    global _worker_features, _worker_orders
+    _worker_features = features
+    _worker_orders = orders
+
+def _score_chunk(weights):
+    return inversion_rates(weights, _worker_features, _worker_orders)
+
+def _score_all(weights, features, orders, chunk_size, pool):
+    chunks = [weights[i:i + chunk_size] for i in range(0, len(weights), chunk_size)]
+    if pool is None:
+        return np.vstack([inversion_rates(c, features, orders) for c in chunks])
+    return np.vstack(list(pool.map(_score_chunk, chunks)))
+
+def tune_weights(metrics_path: str = "kanjimetrics.csv", order_files: Dict[str, str] = ORDER_FILES,
+                 scorer: str = "count", candidates: int = 1000, rounds: int = 3, top: int = 5, seed: int = 0,
+                 workers: int = None, chunk_size: int = 200):
+    """
+    Random search over the weight simplex for one of SCORERS, followed by
+    `rounds` refinement rounds sampled around the best vector so far. The
+    scorer's current weights are always scored too.
+    Returns the `top` results, best first, as dicts with the weights, the mean
+    inversion rate and the rate per order
+    """
+    kanji, features = load_features(metrics_path, scorer)
+    names = list(order_files)
+    orders = [order_indices(load_external_order(order_files[name]), kanji) for name in names]
+
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    pool = None
+    if workers > 1:
+        pool = process_pool(workers, _init_tuning_worker, (features, orders))
+    try:
+        hand_picked = np.array([SCORERS[scorer]["weights"]], dtype=np.float64)
+        weights = np.vstack([hand_picked / hand_picked.sum(axis=1, keepdims=True),
+                             candidate_weights(candidates, seed)])
+        rates = _score_all(weights, features, orders, chunk_size, pool)
+        for r in range(rounds):
+            best = weights[np.argmin(rates.mean(axis=1))]
+            local = candidate_weights(candidates, seed + r + 1, center=best, concentration=100.0 * 2 ** r)
+            weights = np.vstack([weights, local])
+            rates = np.vstack([rates, _score_all(local, features, orders, chunk_size, pool)])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    mean = rates.mean(axis=1)
+    results = []
+    for i in np.argsort(mean, kind="stable")[:top].tolist():
+        results.append({
+            "weights": tuple(float(w) for w in weights[i]),
+            "mean_rate": float(mean[i]),
+            "rates": {name: float(rates[i, j]) for j, name in enumerate(names)},
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for scorer, spec in SCORERS.items():
+        start = time.perf_counter()
+        results = tune_weights(scorer=scorer)
+        print(f"=== {scorer} scorer, searched in {time.perf_counter() - start:.1f}s ===")
+
+        kanji, features = load_features(scorer=scorer)
+        orders = [order_indices(load_external_order(path), kanji) for path in ORDER_FILES.values()]
+        rates = inversion_rates(np.array(spec["weights"], dtype=np.float64), features, orders)[0]
+        per_order = ", ".join(f"{name} {rate:.4f}" for name, rate in zip(ORDER_FILES, rates))
+        print(f"hand picked {spec['weights']}: mean {rates.mean():.4f} | {per_order}")
+        print("best weights (strokes, grade, jlpt, freq):")
+        for result in results:
+            weights = ", ".join(f"{w:.3f}" for w in result["weights"])
+            per_order = ", ".join(f"{name} {rate:.4f}" for name, rate in result["rates"].items())
+            print(f"({weights}): mean {result['mean_rate']:.4f} | {per_order}")
+        print()
@@ -0,0 +1,242 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import numpy as np
+from compiled import compiled_graph, forget_compiled, _imputed_bits
+from parsing import kanji_class, iter_json_array, calculate_difficulty, calculate_edge_weight
+
+# Incremental updates of a live graph. Metric corrections (a kanjimetrics.csv
+# row) and component changes (a krad.json entry) are applied to the kanji
+# dict, and to its compiled graph when there is one, rebuilding only the
+# composed lists that can change:
+#  - strokes of k: the weights of k's out edges and of its neighbors' edges
+#    back to k (edges exist in both directions), so k and its neighbors
+#  - components of a literal: the literal, its old and its new components
+#  - a new kanji: itself and every node it gets an edge with
+# Every rebuilt list comes out exactly like parse_raw_data would build it.
+# Listeners get a graph_update describing the change after each apply.
+
+METRICS = ("strokes", "grade", "jlpt", "rfreq", "kfreq")
+
+@dataclass
+class graph_update:
+    """What one apply changed. kanji_dict / graph: the updated structures"""
+    kanji_dict: dict
+    graph: compiled_graph
+    metrics: set = field(default_factory=set) #kanji whose metrics (and difficulty) changed
+    adjacency: set = field(default_factory=set) #kanji whose composed list / out edges changed
+    added: set = field(default_factory=set) #kanji that became nodes
+    components: set = field(default_factory=set) #krad literals whose components changed
+
+    @property
+    def edges_changed(self):
+        return bool(self.adjacency)
+
+def invalidate_indexes(event: graph_update):
+    """
+    Default listener: when edges changed drops the per-graph ALT and
+    reachability indexes, the radix search's integer weights and the cached
+    shortest path trees the change can affect, and marks the CH index stale
+    (CH queries use Dijkstra until it is rebuilt). Also drops a compiled form
+    of the dict that was not updated with it
+    """
+    if event.metrics or event.adjacency or event.added:
+        forget_compiled(event.kanji_dict, keep=event.graph)
+    if event.graph is None or not event.edges_changed:
+        return
+    import alt, ch, radix, reachability
+    from tree_cache import default_tree_cache
+    for module in (alt, reachability):
+        module._indexes.pop(event.graph, None)
+    #not rebuilt on the next query like the others, see rebuild_ch_in_background
+    ch.invalidate_ch_index(event.graph)
+    radix._weights.pop(event.graph, None)
+    default_tree_cache.on_update(event)
+
+def rebuild_ch_in_background(event: graph_update):
+    """
+    Opt-in listener (graph_updater.subscribe): rebuilds a hierarchy that the
+    update made stale in a daemon thread. CH queries use Dijkstra meanwhile
+    """
+    if event.graph is None or not event.edges_changed:
+        return
+    import threading
+    import ch
+    if event.graph in ch._stale:
+        threading.Thread(target=ch.rebuild_ch_index, args=(event.graph,), daemon=True).start()
+
+class graph_updater:
+    """
+    Applies metric and component changes to kanji_dict (from parse_raw_data)
+    and to graph, its compiled form, when given. Listeners are called with a
+    graph_update after every apply, invalidate_indexes is subscribed by default
+    """
+    def __init__(self, kanji_dict: dict, graph: compiled_graph = None, krad_path: str = "krad.json",
+                 listeners=None):
+        self.kanji_dict = kanji_dict
+        self.graph = graph
+        self.listeners = [invalidate_indexes] if listeners is None else list(listeners)
+        self.components = {}
+        self.order = {}
+        #component -> literals containing it (themselves excluded), in krad order
+        self.composed_in = {}
+        for entry in iter_json_array(krad_path):
+            self._add_entry(entry["literal"], entry["components"])
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _add_entry(self, literal: str, components: list):
+        if literal not in self.order:
+            self.order[literal] = len(self.order)
+        self.components[literal] = list(components)
+        position = self.order[literal]
+        for component in components:
+            if component != literal:
+                literals = self.composed_in.setdefault(component, [])
+                literals.insert(bisect_left([self.order[l] for l in literals], position), literal)
+
+    def _remove_entry(self, literal: str):
+        for component in self.components.pop(literal, []):
+            if component != literal:
+                self.composed_in[component].remove(literal)
+
+    def neighbors(self, kanji: str):
+        """Nodes kanji has an edge with (either direction, same set)"""
+        candidates = self.composed_in.get(kanji, []) + self.components.get(kanji, [])
+        return {k for k in candidates if k in self.kanji_dict}
+
+    def _composed(self, kanji: str):
+        """composed list of kanji as parse_raw_data builds it: composed edges, then components, by weight"""
+        strokes = self.kanji_dict[kanji].strokes
+        edges = [(k, calculate_edge_weight(strokes, self.kanji_dict[k].strokes))
+                 for k in self.composed_in.get(kanji, []) + self.components.get(kanji, [])
+                 if k in self.kanji_dict]
+        edges.sort(key=lambda x: x[1])
+        return edges
+
+    def update_metrics(self, kanji: str, **metrics):
+        return self.apply(metrics={kanji: metrics})
+
+    def set_components(self, literal: str, components: list):
+        return self.apply(components={literal: components})
+
+    def apply(self, metrics: dict = None, components: dict = None) -> graph_update:
+        """
+        metrics: {kanji: {name: value}} with names from METRICS (and id), a
+        kanji that is not a node yet needs every metric and becomes one.
+        components: {literal: component list}, replacing or adding krad entries
+        """
+        event = graph_update(self.kanji_dict, self.graph)
+        for kanji, values in (metrics or {}).items():
+            unknown = set(values) - set(METRICS) - {"id"}
+            if unknown:
+                raise ValueError(f"unknown metrics for {kanji}: {sorted(unknown)}")
+            obj = self.kanji_dict.get(kanji)
+            if obj is None:
+                missing = [name for name in METRICS if name not in values]
+                if missing:
+                    raise ValueError(f"new kanji {kanji} needs every metric, missing {missing}")
+                obj = kanji_class(id=str(values.get("id", self._next_id())), kanji=kanji, difficulty=0.0,
+                                  composed=[], **{name: int(values[name]) for name in METRICS})
+                self.kanji_dict[kanji] = obj
+                event.added.add(kanji)
+                event.adjacency |= {kanji} | self.neighbors(kanji)
+            else:
+                if "strokes" in values and int(values["strokes"]) != obj.strokes:
+                    event.adjacency |= {kanji} | self.neighbors(kanji)
+                for name, value in values.items():
+                    setattr(obj, name, str(value) if name == "id" else int(value))
+                #a measured value replaces an imputed one
+                obj.imputed = tuple(name for name in obj.imputed if name not in values)
+            #the radical frequency feeds the frequency term, like parse_raw_data
+            obj.difficulty = calculate_difficulty(obj.strokes, obj.grade, obj.jlpt, obj.rfreq)
+            event.metrics.add(kanji)
+
+        for literal, new in (components or {}).items():
+            old = self.components.get(literal, [])
+            self._remove_entry(literal)
+            self._add_entry(literal, new)
+            event.components.add(literal)
+            event.adjacency |= {k for k in [literal, *old, *new] if k in self.kanji_dict}
+
+        for kanji in event.adjacency:
+            self.kanji_dict[kanji].composed = self._composed(kanji)
+        if self.graph is not None:
+            self._patch_graph(event)
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def _next_id(self):
+        return max((int(obj.id) for obj in self.kanji_dict.values()), default=0) + 1
+
+    def _patch_graph(self, event: graph_update):
+        """
+        Bring the compiled graph in line, in place so indexes keyed by the graph
+        object see the event: new nodes are appended, changed metrics written,
+        and the touched CSR rows spliced in while untouched rows are moved as
+        whole blocks
+        """
+        graph = self.graph
+        added = [k for k in self.kanji_dict if k in event.added]
+        for kanji in added:
+            graph.index[kanji] = len(graph.kanji)
+            graph.kanji.append(kanji)
+        n = graph.num_nodes
+        columns = {}
+        for name in ("ids", "strokes", "grade", "jlpt", "rfreq", "kfreq", "difficulty", "imputed"):
+            array = getattr(graph, name)
+            #snapshot arrays are read only memory maps, updates work on a copy
+            grown = np.zeros(n, dtype=array.dtype)
+            grown[:len(array)] = array
+            columns[name] = grown
+        for kanji in event.metrics:
+            u, obj = graph.index[kanji], self.kanji_dict[kanji]
+            columns["ids"][u] = int(obj.id)
+            for name in METRICS:
+                columns[name][u] = getattr(obj, name)
+            columns["difficulty"][u] = obj.difficulty
+            columns["imputed"][u] = _imputed_bits(obj.imputed)
+        for name, array in columns.items():
+            setattr(graph, name, array)
+
+        if not event.adjacency:
+            return
+        old_offsets = graph.offsets
+        counts = np.zeros(n, dtype=np.int64)
+        counts[:len(old_offsets) - 1] = np.diff(old_offsets)
+        touched = np.array(sorted(graph.index[k] for k in event.adjacency), dtype=np.int64)
+        rows = [self.kanji_dict[graph.kanji[u]].composed for u in touched.tolist()]
+        counts[touched] = [len(row) for row in rows]
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        neighbors = np.empty(offsets[-1], dtype=np.int32)
+        weights = np.empty(offsets[-1], dtype=np.float64)
+        old_src = np.repeat(np.arange(len(old_offsets) - 1), np.diff(old_offsets))
+        keep = np.ones(len(old_src), dtype=bool)
+        keep[np.isin(old_src, touched)] = False
+        moved = offsets[old_src[keep]] + (np.flatnonzero(keep) - old_offsets[old_src[keep]])
+        neighbors[moved] = graph.neighbors[keep]
+        weights[moved] = graph.weights[keep]
+        for u, row in zip(touched.tolist(), rows):
+            neighbors[offsets[u]:offsets[u + 1]] = [graph.index[k] for k, _ in row]
+            weights[offsets[u]:offsets[u + 1]] = [w for _, w in row]
+        graph.offsets, graph.neighbors, graph.weights = offsets, neighbors, weights
+
+
+if __name__ == '__main__':
+    import time
+    from parsing import parse_raw_data
+    from compiled import compile_graph
+    kanji_dict = parse_raw_data()
+    graph = compile_graph(kanji_dict)
+    updater = graph_updater(kanji_dict, graph, listeners=[])
+    start = time.perf_counter()
+    event = updater.update_metrics("口", strokes=4)
+    print(f"strokes of 口 changed: {len(event.adjacency)} composed lists rebuilt in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    event = updater.set_components("森", ["木", "林"])
+    print(f"components of 森 changed: {sorted(event.adjacency)} rebuilt in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
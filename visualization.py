@@ -1,13 +1,12 @@
-import networkx as nx
-import plotly.graph_objects as go
-from parsing import parse_raw_data
 from greedy import find_learning_path
+from snapshot import load_graph
 import numpy as np
 
 def create_kanji_graph(kanji_dict, path_nodes):
     """
     Create a directed graph containing only nodes in the paths
     """
+    import networkx as nx
     G = nx.DiGraph()
     
     # Add only nodes that are in the paths
@@ -42,38 +41,48 @@ def get_path_edges(paths):
                 path_edges.add((path[i], path[i+1]))
     return path_edges
 
-def create_interactive_plot(G, paths, path_info, kanji_dict):
+def _segments(pos_array, src, dst):
+    """x and y arrays of line segments src[i] → dst[i], NaN separated, for one lines trace"""
+    gap = np.full(len(src), np.nan)
+    x = np.column_stack([pos_array[src, 0], pos_array[dst, 0], gap]).ravel()
+    y = np.column_stack([pos_array[src, 1], pos_array[dst, 1], gap]).ravel()
+    return x, y
+
+def create_interactive_plot(G, paths, path_info, kanji_dict, layout="spring", cache=None):
     """
     Create interactive plotly visualization showing learning paths
+    layout: "spring" (cached, see layouts.layout_cache), "strokes" or "depth"
+    (layouts.layered_layout columns), or a precomputed {node: (x, y)} dict
+    cache: layout_cache for the spring layout, layouts.default_layout_cache if None
     """
+    import plotly.graph_objects as go
+    from layouts import default_layout_cache, layered_layout
     print(f"Calculating layout for {G.number_of_nodes()} nodes...")
     
-    # Use hierarchical layout for path visualization
-    try:
-        pos = nx.spring_layout(G, k=2, iterations=50, seed=42)
-    except:
-        pos = nx.kamada_kawai_layout(G)
+    if isinstance(layout, dict):
+        pos = layout
+    elif layout in ("strokes", "depth"):
+        pos = layered_layout(G, by=layout, paths=paths)
+    else:
+        # Use hierarchical layout for path visualization
+        pos = (cache or default_layout_cache).layout(G, layout, k=2, iterations=50, seed=42)
     
     print("Creating traces...")
     
     path_edges = get_path_edges(paths)
     
+    # Node positions as one array, edges as index arrays into it
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    xy = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+    edges = list(G.edges())
+    src = np.array([index[u] for u, _ in edges], dtype=np.int64)
+    dst = np.array([index[v] for _, v in edges], dtype=np.int64)
+    on_path = np.array([edge in path_edges for edge in edges], dtype=bool)
+    
     # Create edge traces - separate for path edges and other edges
-    path_edge_x = []
-    path_edge_y = []
-    other_edge_x = []
-    other_edge_y = []
-    
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        
-        if edge in path_edges:
-            path_edge_x.extend([x0, x1, None])
-            path_edge_y.extend([y0, y1, None])
-        else:
-            other_edge_x.extend([x0, x1, None])
-            other_edge_y.extend([y0, y1, None])
+    other_edge_x, other_edge_y = _segments(xy, src[~on_path], dst[~on_path])
+    path_edge_x, path_edge_y = _segments(xy, src[on_path], dst[on_path])
     
     # Other edges (faded)
     other_edge_trace = go.Scatter(
@@ -98,77 +107,44 @@ def create_interactive_plot(G, paths, path_info, kanji_dict):
     )
     
     # Identify which nodes are in paths
-    path_nodes = set()
     source_nodes = set()
     target_nodes = set()
     
     for i, path in enumerate(paths):
         if path:
-            path_nodes.update(path)
             source_nodes.add(path[0])
             target_nodes.add(path[-1])
     
-    # Create node traces
-    node_x = []
-    node_y = []
-    node_text = []
-    node_hover = []
-    node_color = []
-    node_size = []
-    node_symbol = []
-    
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(node)
-        
-        # Get node attributes
-        attrs = G.nodes[node]
-        difficulty = attrs['difficulty']
-        strokes = attrs['strokes']
-        grade = attrs['grade']
-        jlpt = attrs['jlpt']
-        kfreq = attrs['kfreq']
-        degree = G.degree(node)
-        
-        # Determine node type
-        if node in source_nodes:
-            node_type = "SOURCE"
-            color_val = 0.0  # Green
-        elif node in target_nodes:
-            node_type = "TARGET"
-            color_val = 1.0  # Red
-        else:
-            node_type = "PATH"
-            color_val = difficulty
-        
-        # Create hover text
-        node_hover.append(
-            f"<b>{node}</b> [{node_type}]<br>"
-            f"Strokes: {strokes}<br>"
-            f"Grade: {grade}<br>"
-            f"JLPT: {jlpt}<br>"
-            f"Freq: {kfreq}<br>"
-            f"Difficulty: {difficulty:.3f}<br>"
-            f"Connections: {degree}<br>"
-            f"<i>Click to see all edges</i>"
-        )
-        
-        node_color.append(color_val)
-        
-        # Size by type
-        if node in source_nodes or node in target_nodes:
-            node_size.append(20)
-            node_symbol.append('diamond' if node in source_nodes else 'square')
-        else:
-            node_size.append(12)
-            node_symbol.append('circle')
+    # Node attributes as columns
+    attrs = [G.nodes[node] for node in nodes]
+    difficulty = np.array([a['difficulty'] for a in attrs], dtype=np.float64)
+    is_source = np.array([node in source_nodes for node in nodes], dtype=bool)
+    is_target = np.array([node in target_nodes for node in nodes], dtype=bool) & ~is_source
+    degree = np.bincount(np.concatenate([src, dst]), minlength=len(nodes))
+    
+    # Sources green, targets red, the rest by difficulty
+    node_color = np.where(is_source, 0.0, np.where(is_target, 1.0, difficulty))
+    node_size = np.where(is_source | is_target, 20, 12)
+    node_symbol = np.where(is_source, 'diamond', np.where(is_target, 'square', 'circle'))
+    node_type = np.where(is_source, 'SOURCE', np.where(is_target, 'TARGET', 'PATH'))
+    
+    # Create hover text
+    node_hover = [
+        f"<b>{node}</b> [{kind}]<br>"
+        f"Strokes: {a['strokes']}<br>"
+        f"Grade: {a['grade']}<br>"
+        f"JLPT: {a['jlpt']}<br>"
+        f"Freq: {a['kfreq']}<br>"
+        f"Difficulty: {a['difficulty']:.3f}<br>"
+        f"Connections: {d}<br>"
+        f"<i>Click to see all edges</i>"
+        for node, kind, a, d in zip(nodes, node_type.tolist(), attrs, degree.tolist())
+    ]
     
     node_trace = go.Scatter(
-        x=node_x, y=node_y,
+        x=xy[:, 0], y=xy[:, 1],
         mode='markers+text',
-        text=node_text,
+        text=nodes,
         textposition="top center",
         textfont=dict(
             size=11, 
@@ -240,6 +216,162 @@ def create_interactive_plot(G, paths, path_info, kanji_dict):
     
     return fig, config
 
+def network_positions(graph, layout="strokes", cache=None):
+    """
+    (n, 2) positions of every kanji of a compiled graph. "strokes": columns by
+    stroke count, stacked by difficulty (numpy only). "spring": through the
+    layout cache. networkx needs scipy for that above 500 nodes, without it
+    the strokes layout is used
+    """
+    from layouts import default_layout_cache, layered_positions
+    if layout == "strokes":
+        return layered_positions(graph.strokes, graph.difficulty)
+    import networkx as nx
+    G = nx.DiGraph()
+    G.add_nodes_from(graph.kanji)
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.offsets))
+    G.add_edges_from((graph.kanji[u], graph.kanji[v])
+                     for u, v in zip(src.tolist(), np.asarray(graph.neighbors).tolist()) if u != v)
+    try:
+        pos = (cache or default_layout_cache).layout(G, layout, k=2, iterations=50, seed=42)
+    except ImportError as e:
+        print(f"{layout} layout needs {e.name or 'scipy'} for {graph.num_nodes} nodes, using the strokes layout")
+        return layered_positions(graph.strokes, graph.difficulty)
+    return np.array([pos[k] for k in graph.kanji], dtype=np.float64)
+
+def decimate_edges(graph, weight_threshold=None, max_edges=20000, levels=3):
+    """
+    Edges of a compiled graph to draw: no self loops, weight <= weight_threshold,
+    at most max_edges of the lightest. Returns (src, dst, weight, level) with
+    level 0 for the lightest of `levels` equal sized weight bands
+    """
+    weights = np.asarray(graph.weights)
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.offsets))
+    dst = np.asarray(graph.neighbors)
+    keep = src != dst
+    if weight_threshold is not None:
+        keep &= weights <= weight_threshold
+    src, dst, weights = src[keep], dst[keep], weights[keep]
+    order = np.argsort(weights, kind="stable")[:max_edges]
+    src, dst, weights = src[order], dst[order], weights[order]
+    level = np.arange(len(weights)) * levels // max(len(weights), 1)
+    return src, dst, weights, level
+
+def create_network_plot(graph, paths=(), layout="strokes", cache=None, weight_threshold=None,
+                        max_edges=20000, levels=3):
+    """
+    WebGL plot of the whole composition network of a compiled graph. Edges are
+    decimated (decimate_edges) into `levels` traces by weight, only the
+    lightest band is shown at first, the legend toggles the others. Arrays go
+    out as float32, so plotly writes them as compact binary
+    """
+    import plotly.graph_objects as go
+    print(f"Calculating layout for {graph.num_nodes} nodes...")
+    xy = network_positions(graph, layout, cache)
+    src, dst, weights, level = decimate_edges(graph, weight_threshold, max_edges, levels)
+    print(f"Drawing {len(src)} of {graph.num_edges} edges in {levels} levels...")
+
+    traces = []
+    for lod in range(levels):
+        band = level == lod
+        if not band.any():
+            continue
+        x, y = _segments(xy, src[band], dst[band])
+        traces.append(go.Scattergl(
+            x=x.astype(np.float32), y=y.astype(np.float32),
+            mode='lines',
+            line=dict(width=0.5 if lod == 0 else 0.3, color='#888' if lod == 0 else '#555'),
+            hoverinfo='none',
+            opacity=0.5 if lod == 0 else 0.3,
+            name=f"weight ≤ {weights[band].max():g}",
+            visible=True if lod == 0 else 'legendonly'
+        ))
+
+    # Learning paths on top of the network
+    index = graph.index
+    path_edges = np.array([(index[u], index[v]) for u, v in get_path_edges(paths)
+                           if u in index and v in index], dtype=np.int64).reshape(-1, 2)
+    if len(path_edges):
+        x, y = _segments(xy, path_edges[:, 0], path_edges[:, 1])
+        traces.append(go.Scattergl(
+            x=x.astype(np.float32), y=y.astype(np.float32),
+            mode='lines',
+            line=dict(width=2, color='#00ff88'),
+            hoverinfo='none',
+            name='learning path'
+        ))
+
+    # Hover from binary customdata and one template instead of a string per kanji
+    degree = np.diff(graph.offsets)
+    customdata = np.column_stack([graph.strokes, graph.grade, graph.jlpt, graph.difficulty, degree]).astype(np.float32)
+    traces.append(go.Scattergl(
+        x=xy[:, 0].astype(np.float32), y=xy[:, 1].astype(np.float32),
+        mode='markers',
+        text=graph.kanji,
+        customdata=customdata,
+        hovertemplate="<b>%{text}</b> strokes %{customdata[0]}, grade %{customdata[1]}, JLPT %{customdata[2]}"
+                      "<br>difficulty %{customdata[3]:.3f}, %{customdata[4]} composed<extra></extra>",
+        marker=dict(
+            size=(4 + 2 * np.sqrt(degree)).clip(max=16).astype(np.float32),
+            color=np.asarray(graph.difficulty, dtype=np.float32),
+            colorscale='RdYlGn_r',
+            showscale=True,
+            colorbar=dict(thickness=15, title=dict(text='Difficulty', side='right'), len=0.7),
+            opacity=0.9
+        ),
+        name='kanji',
+        showlegend=False
+    ))
+
+    # Labels only for the kanji on the paths
+    path_nodes = [index[k] for k in dict.fromkeys(k for path in paths if path for k in path) if k in index]
+    if path_nodes:
+        traces.append(go.Scattergl(
+            x=xy[path_nodes, 0].astype(np.float32), y=xy[path_nodes, 1].astype(np.float32),
+            mode='markers+text',
+            text=[graph.kanji[u] for u in path_nodes],
+            textposition='top center',
+            textfont=dict(size=12, color='white'),
+            hoverinfo='skip',
+            marker=dict(size=10, color='#00ff88', line=dict(width=1, color='white')),
+            name='path kanji',
+            showlegend=False
+        ))
+
+    fig = go.Figure(
+        data=traces,
+        layout=go.Layout(
+            title=dict(
+                text=f'<b>Kanji Composition Network</b><br><sub>{graph.num_nodes} kanji • '
+                     f'{len(src)} of {graph.num_edges} edges • legend toggles edge levels</sub>',
+                x=0.5,
+                xanchor='center',
+                font=dict(size=18)
+            ),
+            showlegend=True,
+            legend=dict(bgcolor='rgba(0,0,0,0.6)'),
+            hovermode='closest',
+            margin=dict(b=20, l=5, r=5, t=100),
+            xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+            yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+            plot_bgcolor='#0f0f0f',
+            paper_bgcolor='#1a1a1a',
+            font=dict(color='white'),
+            width=1600,
+            height=900,
+            dragmode='pan'
+        )
+    )
+
+    config = {
+        'scrollZoom': True,
+        'displayModeBar': True,
+        'displaylogo': False,
+        'modeBarButtonsToRemove': ['lasso2d', 'select2d']
+    }
+
+    return fig, config
+
 def create_path_annotations(path_info):
     """Create annotations showing path information"""
     annotations = []
@@ -321,14 +453,44 @@ def print_path_details(paths, path_info, kanji_dict):
                   f"Difficulty: {obj.difficulty:.3f}")
         print()
 
-def main():
+def network_main(kanji_dict, paths, args):
+    """Whole network with the example paths highlighted, saved to kanji_network.html"""
+    from layouts import LAYOUT_CACHE_DIR, layout_cache
+    fig, config = create_network_plot(kanji_dict, paths, layout=args.layout, cache=layout_cache(LAYOUT_CACHE_DIR),
+                                      weight_threshold=args.weight_threshold, max_edges=args.max_edges,
+                                      levels=args.levels)
+    print("\nSaving to HTML...")
+    fig.write_html(
+        "kanji_network.html",
+        config=config,
+        include_plotlyjs='cdn'
+    )
+    print("✓ Visualization saved to kanji_network.html")
+    
+    print("\nOpening in browser...")
+    fig.show(config=config)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Plot kanji learning paths")
+    parser.add_argument("--network", action="store_true", help="plot the whole composition network (WebGL)")
+    parser.add_argument("--layout", default="strokes", choices=("strokes", "spring"), help="network layout (spring needs scipy)")
+    parser.add_argument("--max-edges", type=int, default=20000, help="network edges drawn at most")
+    parser.add_argument("--weight-threshold", type=float, default=None, help="drop network edges heavier than this")
+    parser.add_argument("--levels", type=int, default=3, help="edge levels of detail")
+    args = parser.parse_args(argv)
+    
     print("Loading kanji data...")
-    kanji_dict = parse_raw_data()
+    kanji_dict = load_graph()
     print(f"Loaded {len(kanji_dict)} kanji")
     
     # Find example learning paths
     paths, path_info, all_nodes = find_example_paths(kanji_dict)
     
+    if args.network:
+        network_main(kanji_dict, paths, args)
+        return
+    
     if not paths:
         print("No paths found!")
         return
@@ -346,7 +508,8 @@ def main():
     
     # Create visualization
     print("\nGenerating visualization...")
-    fig, config = create_interactive_plot(G, paths, path_info, kanji_dict)
+    from layouts import LAYOUT_CACHE_DIR, layout_cache
+    fig, config = create_interactive_plot(G, paths, path_info, kanji_dict, cache=layout_cache(LAYOUT_CACHE_DIR))
     
     print("\nSaving to HTML...")
     fig.write_html(